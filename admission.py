@@ -0,0 +1,140 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+# --- Admission control for the AI-backed routes ---
+# Two layers in front of every request that turns into a Gemini call:
+#   1. RateLimiter: a token bucket per client, so one client cannot use up the quota
+#   2. AdmissionQueue: at most max_active requests run at once; the rest wait in a
+#      bounded priority queue (answers to running interviews first, new research last)
+# A request that cannot get in is rejected right away with Overloaded(retry_after),
+# which the app turns into 429/503 + Retry-After instead of piling up threads.
+class Overloaded(Exception):
+    def __init__(self, message, retry_after, status=429, reason="queue_full"):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+        self.reason = reason # rate_limited, queue_full or queue_timeout (metrics label)
+
+
+class RateLimiter:
+    def __init__(self, rate_per_minute=30, burst=10, max_clients=10000):
+        self.rate = rate_per_minute / 60.0 # Tokens per second
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict() # client -> (tokens, updated_at), least recently seen first
+        self._lock = threading.Lock()
+
+    def check(self, client):
+        """Take one token for client or raise Overloaded."""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[client] = (tokens, now)
+            # Forget the least recently seen clients; they come back with a full bucket
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        if not allowed:
+            raise Overloaded("Bạn gửi quá nhiều yêu cầu. Vui lòng thử lại sau ít phút.",
+                             retry_after=math.ceil((1 - tokens) / self.rate), reason="rate_limited")
+
+
+class _Waiter:
+    def __init__(self, priority, seq):
+        self.priority = priority
+        self.seq = seq
+        self.rejected = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionQueue:
+    # Lower number = served first
+    PRIORITIES = {"answer": 0, "start": 1, "research": 2, "batch": 3, "prefetch": 4}
+
+    def __init__(self, max_active=8, max_queue=32, queue_timeout=10.0):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiting = [] # heap of _Waiter
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._avg_hold = 1.0 # Moving average of how long a slot is held, for Retry-After
+        self._stats = {"admitted": 0, "queued": 0, "rejected_full": 0, "rejected_timeout": 0, "displaced": 0}
+
+    def acquire(self, route_class):
+        """Wait for a slot (up to queue_timeout) or raise Overloaded. Returns the acquire time."""
+        priority = self.PRIORITIES[route_class]
+        with self._cond:
+            if self._active < self.max_active and not self._waiting:
+                return self._admit_locked()
+
+            if len(self._waiting) >= self.max_queue:
+                # Full: a more important request displaces the least important waiter
+                lowest = max(self._waiting) if self._waiting else None
+                if lowest is None or lowest.priority <= priority:
+                    self._stats["rejected_full"] += 1
+                    raise Overloaded("Hệ thống đang quá tải. Vui lòng thử lại sau.", self._retry_after_locked())
+                self._remove_locked(lowest)
+                lowest.rejected = True
+                self._stats["displaced"] += 1
+
+            waiter = _Waiter(priority, next(self._seq))
+            heapq.heappush(self._waiting, waiter)
+            self._stats["queued"] += 1
+            self._cond.notify_all() # Wake a displaced waiter so it can give up
+            deadline = time.monotonic() + self.queue_timeout
+            while True:
+                if waiter.rejected:
+                    self._stats["rejected_full"] += 1
+                    raise Overloaded("Hệ thống đang quá tải. Vui lòng thử lại sau.", self._retry_after_locked())
+                if self._waiting[0] is waiter and self._active < self.max_active:
+                    heapq.heappop(self._waiting)
+                    self._cond.notify_all() # The next waiter may fit too
+                    return self._admit_locked()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove_locked(waiter)
+                    self._stats["rejected_timeout"] += 1
+                    raise Overloaded("Hệ thống đang bận. Vui lòng thử lại sau.", self._retry_after_locked(),
+                                     status=503, reason="queue_timeout")
+                self._cond.wait(remaining)
+
+    def release(self, acquired_at):
+        with self._cond:
+            self._active -= 1
+            self._avg_hold = 0.9 * self._avg_hold + 0.1 * (time.monotonic() - acquired_at)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(active=self._active, waiting=len(self._waiting))
+        return stats
+
+    # --- Internals ---
+    def _admit_locked(self):
+        self._active += 1
+        self._stats["admitted"] += 1
+        return time.monotonic()
+
+    def _remove_locked(self, waiter):
+        self._waiting.remove(waiter)
+        heapq.heapify(self._waiting)
+        self._cond.notify_all()
+
+    def _retry_after_locked(self):
+        # Time for the queue ahead to drain through the active slots
+        return max(1, math.ceil(self._avg_hold * (len(self._waiting) + 1) / max(1, self.max_active)))
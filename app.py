@@ -1,98 +1,483 @@
 import os
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, abort, g, request, jsonify, stream_with_context
 from flask_cors import CORS # Cần thiết nếu frontend và backend chạy trên các cổng khác nhau
 from dotenv import load_dotenv
-import google.generativeai as genai
-import json # Để lưu/tải trạng thái phỏng vấn đơn giản
+import contextlib
+import functools
+import json
+import math
+import threading
+import time
+from llm_client import AIError, AIUpstreamError, LLMClient
+from llm_providers import FakeProvider, GeminiProvider
+from model_router import RoutedProvider, parse_routes
+import metrics
+from admission import AdmissionQueue, Overloaded, RateLimiter
+from batch_grading import Checkpoint, grade_batch
+from interview_prompts import (build_feedback_prompt, build_final_score_prompt, build_first_question_prompt,
+                               feedback_schema, final_evaluation_schema, parse_feedback_response,
+                               parse_final_evaluation, score_points)
+from jobs import JobManager
+from metrics import ADMISSION_REJECTED, ADMISSION_WAIT, HTTP_REQUEST_DURATION, QUESTIONS_SERVED, log, log_event
+from prompt_budget import compact_history, prompt_tokens
+from question_bank import QuestionBank
+from question_prefetch import QuestionPool
+from research_cache import ResearchCache
+from response_parser import completed_section
+from session_store import SessionConflict, SessionStore # Lưu trạng thái phỏng vấn theo từng phiên
+from static_assets import StaticAssets
 
 load_dotenv() # Load biến môi trường từ file .env
 
+# Chọn backend AI: "gemini" (mặc định) hoặc "fake" (giả lập cục bộ cho kiểm thử tải / benchmark, không cần API key)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+
+# Chọn model phù hợp (ví dụ: gemini-pro)
+# Tùy thuộc vào khả năng và giới hạn của các model hiện tại của Google AI Studio
+MODEL_NAME = os.getenv("MODEL_NAME", "gemini-2.0-flash") # Hoặc model khác phù hợp
+
+# Model per prompt kind, primary first then lighter fallbacks, e.g.
+#   MODEL_ROUTES="feedback=gemini-2.0-flash,gemini-2.0-flash-lite;final_score=gemini-2.5-flash,gemini-2.0-flash"
+# Kinds: first_question, feedback, final_score, research, summary, repair. Unlisted kinds use MODEL_NAME.
+# Fallbacks are tried only on retryable errors (429, 5xx, timeouts); other errors are raised as is.
+MODEL_ROUTES = parse_routes(os.getenv("MODEL_ROUTES"))
+# Hedging: if the primary has not answered after max(AI_HEDGE_AFTER_MS, its recent
+# AI_HEDGE_QUANTILE latency), a backup request is sent and the first answer wins. 0 = tắt.
+AI_HEDGE_AFTER_MS = float(os.getenv("AI_HEDGE_AFTER_MS", "0"))
+AI_HEDGE_QUANTILE = float(os.getenv("AI_HEDGE_QUANTILE", "0.95"))
+
+
 # Cấu hình Google AI API
+# Only the key is checked at import time; configuring the SDK and creating the model
+# happen lazily, once per worker process, on the first AI call (see get_llm_provider).
 API_KEY = os.getenv("GOOGLE_API_KEY")
-if not API_KEY:
+if LLM_PROVIDER != "fake" and not API_KEY:
     # Log an error or raise a more specific exception if preferred
-    print("Error: GOOGLE_API_KEY not found in .env file. Please create a .env file with your API key.")
+    log("Error: GOOGLE_API_KEY not found in .env file. Please create a .env file with your API key.")
     # As a fallback for local testing without .env, you might prompt or use None, but raising is safer.
     # For now, we'll raise the original error if the key isn't found.
     raise ValueError("GOOGLE_API_KEY not found in .env file")
 
-try:
-    genai.configure(api_key=API_KEY)
-except Exception as e:
-     print(f"Error configuring Google AI with provided API key: {e}")
-     print("Please check your GOOGLE_API_KEY in the .env file.")
-     # Depending on severity, you might raise here or proceed with limited functionality
-     # For now, let's proceed but AI calls will likely fail if configuration failed.
+# Yêu cầu AI trả về JSON theo schema thay vì các phần ---...--- (Gemini response_schema)
+AI_JSON_OUTPUT = os.getenv("AI_JSON_OUTPUT", "0") == "1"
+AI_WARMUP = os.getenv("AI_WARMUP", "0") == "1" # Gửi một lời gọi AI nhỏ khi worker khởi động (qua /readyz)
+READINESS_CACHE_SECONDS = 30 # How long a successful /readyz upstream check is reused
 
 
-# Chọn model phù hợp (ví dụ: gemini-pro)
-# Tùy thuộc vào khả năng và giới hạn của các model hiện tại của Google AI Studio
-MODEL_NAME = "gemini-2.0-flash" # Hoặc model khác phù hợp
-
-# Simple check if the model is available (optional but good practice)
-# This check itself can sometimes fail depending on the API status,
-# so handle potential exceptions here as well.
-try:
-    # This is a lightweight way to check if the model name is valid
-    # A more robust check might involve listing models, but this is simpler.
-    test_model = genai.GenerativeModel(MODEL_NAME)
-    print(f"Successfully loaded model: {MODEL_NAME}")
-except Exception as e:
-    print(f"Error loading model {MODEL_NAME}: {e}")
-    print("Please ensure you have a valid API key and the model name is correct and available for your account.")
-    print("Proceeding, but AI calls might fail.")
-    # Set model to None or handle failure appropriately in API endpoints
-    test_model = None # Indicate model failed to load
-
-
-model = test_model # Use the potentially None model
-
-app = Flask(__name__, static_folder='.')
+def create_gemini_provider(model_name):
+    import google.generativeai as genai # Only needed for the real backend
+
+    try:
+        genai.configure(api_key=API_KEY)
+    except Exception as e:
+         log(f"Error configuring Google AI with provided API key: {e}")
+         log("Please check your GOOGLE_API_KEY in the .env file.")
+         # Depending on severity, you might raise here or proceed with limited functionality
+         # For now, let's proceed but AI calls will likely fail if configuration failed.
+
+
+    # Simple check if the model is available (optional but good practice)
+    # This check itself can sometimes fail depending on the API status,
+    # so handle potential exceptions here as well.
+    try:
+        # This is a lightweight way to check if the model name is valid
+        # A more robust check might involve listing models, but this is simpler.
+        test_model = genai.GenerativeModel(model_name)
+        log(f"Successfully loaded model: {model_name} (pid {os.getpid()})")
+    except Exception as e:
+        log(f"Error loading model {model_name}: {e}")
+        log("Please ensure you have a valid API key and the model name is correct and available for your account.")
+        log("Proceeding, but AI calls might fail.")
+        # Set model to None or handle failure appropriately in API endpoints
+        test_model = None # Indicate model failed to load
+
+    return GeminiProvider(test_model) if test_model is not None else None
+
+
+# model_index gives every routed model its own random stream
+def create_fake_provider(model_index=0):
+    return FakeProvider(
+        latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "200")), # Độ trễ trung vị
+        latency_sigma=float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5")), # Độ phân tán (log-normal)
+        error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")), # Tỉ lệ lỗi 503 giả lập
+        seed=int(os.getenv("FAKE_LLM_SEED", "0")) + model_index,
+        malformed_rate=float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0")), # Tỉ lệ phản hồi sai định dạng
+    )
+
+
+# One provider per model named in MODEL_NAME / MODEL_ROUTES, behind the routing layer.
+# None if the default model failed to load; routes through other failed models fall back to it.
+def create_routed_provider():
+    default_models = [MODEL_NAME]
+    model_names = list(dict.fromkeys(default_models + [m for models in MODEL_ROUTES.values() for m in models]))
+    providers = {}
+    for index, model_name in enumerate(model_names):
+        if LLM_PROVIDER == "fake":
+            providers[model_name] = create_fake_provider(index)
+        else:
+            providers[model_name] = create_gemini_provider(model_name)
+    if providers[MODEL_NAME] is None:
+        return None
+
+    routes = {}
+    for kind, models in MODEL_ROUTES.items():
+        available = [model for model in models if providers[model] is not None]
+        routes[kind] = available or default_models
+    providers = {name: provider for name, provider in providers.items() if provider is not None}
+    return RoutedProvider(
+        providers, routes, default_models,
+        hedge_after=AI_HEDGE_AFTER_MS / 1000.0 if AI_HEDGE_AFTER_MS > 0 else None,
+        hedge_quantile=AI_HEDGE_QUANTILE,
+        max_workers=2 * int(os.getenv("AI_MAX_CONCURRENCY", "8")),
+    )
+
+
+# --- Lazy, fork-safe AI initialization ---
+# Nothing network-related happens at import, so a gunicorn master can import the app and fork
+# cheaply. Each worker builds its own provider on first use; the pid check means a provider
+# created before a fork is never shared with the children.
+_provider_lock = threading.Lock()
+_worker_ai = {"pid": None, "provider": None, "ready_at": 0.0}
+
+
+def get_llm_provider():
+    pid = os.getpid()
+    if _worker_ai["pid"] != pid:
+        with _provider_lock:
+            if _worker_ai["pid"] != pid:
+                if LLM_PROVIDER == "fake":
+                    log("Using the local fake AI provider (LLM_PROVIDER=fake).")
+                provider = create_routed_provider() # None if the model failed to load
+                _worker_ai.update(pid=pid, provider=provider, ready_at=0.0)
+    return _worker_ai["provider"]
+
+
+# static_folder=None: Flask's default /static route would expose every file in the repo root
+app = Flask(__name__, static_folder=None)
 CORS(app) # Cho phép Cross-Origin requests (quan trọng khi dev)
 
+# Frontend files: only these are served (never .env, sources or data files),
+# loaded and precompressed once at startup
+STATIC_FILES = ["index.html", "script.js", "style.css"]
+static_assets = StaticAssets(os.path.dirname(os.path.abspath(__file__)), STATIC_FILES)
+
 # --- State Management for Interview ---
-# In a real app, use sessions or database. For this example, a simple dict works
-# Structure: { "session_id": { "topic": "...", "question_index": 0, "history": [...], "score": 0 } }
-# We'll simulate a single user for simplicity here, not using session_id
-interview_state = {
-    "active": False,
-    "topic": None,
-    "current_question_index": 0,
-    "questions": [],
-    "answers": [],
-    "feedback": [],
-    "score": 0
-}
+# Each interview lives in its own session, keyed by the session_id returned from /interview/start.
+# Structure: { "session_id": { "active": ..., "topic": "...", "current_question_index": 0, "questions": [...], ... } }
+# Sessions are kept in memory (LRU, expired after idle timeout) and optionally persisted to SQLite.
+session_store = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX_ACTIVE", "500")),
+    idle_timeout=int(os.getenv("SESSION_IDLE_TIMEOUT", "3600")),
+    db_path=os.getenv("SESSION_DB_PATH") or None, # Để trống = chỉ lưu trong bộ nhớ
+)
 MAX_QUESTIONS = 10
 
+# Topics offered in the UI (index.html); their first questions are prefetched
+INTERVIEW_TOPICS = [
+    "Lập trình Web Frontend",
+    "Python Backend Development",
+    "Mạng Máy tính Cơ bản",
+    "Lập trình Mobile (Android/iOS)",
+    "IoT (Internet of Things)",
+    "Tư duy thuật toán (Data Structures & Algorithms)",
+]
+
+# --- Warm pool of pre-generated first questions ---
+# Prefetch goes through admission at the lowest priority, so it only uses idle slots.
+# admission_slot and generate_first_question are defined below; looked up at call time.
+def prefetch_first_question(topic):
+    with admission_slot("prefetch"):
+        return generate_first_question(topic)
+
+
+question_pool = QuestionPool(
+    prefetch_first_question,
+    INTERVIEW_TOPICS,
+    pool_size=int(os.getenv("QUESTION_POOL_SIZE", "2")), # 0 = tắt prefetch
+    ttl=int(os.getenv("QUESTION_POOL_TTL", "1800")),
+)
+
+# --- Question bank ---
+# Records every question asked, per topic, without near-duplicates; with
+# QUESTION_BANK_RATIO > 0 that share of questions is served from the bank instead of
+# generated. A banked first question needs no AI call at all; for later questions the
+# AI still writes the feedback, with a shorter feedback-only prompt.
+question_bank = QuestionBank(
+    serve_ratio=float(os.getenv("QUESTION_BANK_RATIO", "0")), # 0 = chỉ ghi lại, luôn tạo câu hỏi mới
+    threshold=float(os.getenv("QUESTION_BANK_SIMILARITY", "0.7")),
+    min_questions=int(os.getenv("QUESTION_BANK_MIN_SIZE", "5")),
+    db_path=os.getenv("QUESTION_BANK_DB_PATH") or None, # Để trống = chỉ lưu trong bộ nhớ
+)
+
+# --- Cache for /research reports ---
+research_cache = ResearchCache(
+    max_entries=int(os.getenv("RESEARCH_CACHE_SIZE", "256")),
+    ttl=int(os.getenv("RESEARCH_CACHE_TTL", "86400")),
+    db_path=os.getenv("RESEARCH_CACHE_DB_PATH") or None, # Để trống = chỉ lưu trong bộ nhớ
+)
+
+# --- Background jobs (final evaluation, research reports) ---
+job_manager = JobManager(
+    max_workers=int(os.getenv("JOB_WORKERS", "4")),
+    ttl=int(os.getenv("JOB_TTL", "3600")),
+    db_path=os.getenv("JOB_DB_PATH") or None, # Để trống = chỉ lưu trong bộ nhớ (cần khi chạy nhiều worker)
+    max_queue=int(os.getenv("JOB_MAX_QUEUE", "32")), # Số tác vụ chờ tối đa; vượt quá trả về 429
+    max_runtime=int(os.getenv("JOB_MAX_RUNTIME", "300")), # Quá thời gian này tác vụ được báo lỗi
+)
+# 1 = the last answer returns right after its feedback and the final evaluation runs as a job
+FINAL_EVALUATION_ASYNC = os.getenv("FINAL_EVALUATION_ASYNC", "1") == "1"
+
+metrics.Gauge("interview_sessions_in_memory", "Interview sessions held in the in-memory tier.", lambda: len(session_store))
+metrics.CallbackCounter("research_cache_hits_total", "Research reports served from cache (memory + disk).",
+                        lambda: research_cache.stats()["hits"] + research_cache.stats()["disk_hits"])
+metrics.CallbackCounter("research_cache_misses_total", "Research requests that missed the cache.",
+                        lambda: research_cache.stats()["misses"])
+metrics.Gauge("question_pool_ready", "Prefetched first questions ready to serve.", lambda: question_pool.stats()["ready"])
+metrics.Gauge("background_jobs_running", "Background jobs (final evaluations, research) not finished yet.",
+              lambda: job_manager.stats().get("pending", 0) + job_manager.stats().get("running", 0))
+
 # --- Helper Function to generate AI responses ---
-def generate_ai_response(prompt, history=None):
-    if model is None:
-        print("Attempted AI call but model failed to load.")
-        return "Đã xảy ra lỗi: Mô hình AI không khả dụng."
+# Calls go through a shared LLMClient: bounded concurrency, per-call deadline and
+# jittered retries on quota/5xx errors. Failures raise llm_client.AIError subclasses.
+llm_client = LLMClient(
+    get_llm_provider,
+    max_concurrency=int(os.getenv("AI_MAX_CONCURRENCY", "8")),
+    timeout=float(os.getenv("AI_TIMEOUT", "30")),
+    max_retries=int(os.getenv("AI_MAX_RETRIES", "3")),
+)
+
+
+# kind: "first_question", "feedback", "final_score", "research", "summary" or "repair"
+def generate_ai_response(prompt, history=None, kind=None, response_schema=None):
+    return llm_client.generate(prompt, history=history, kind=kind, response_schema=response_schema)
+
+
+# Streaming variant: yields the response text chunk by chunk as Gemini produces it
+def generate_ai_response_stream(prompt, history=None, kind=None, response_schema=None):
+    return llm_client.stream(prompt, history=history, kind=kind, response_schema=response_schema)
+
+
+# Re-prompt for malformed structured output (see interview_prompts.parse_feedback_response).
+# Sent without the interview history: the prompt quotes the malformed output itself.
+def repair_ai_response(topic):
+    def repair(prompt, response_schema):
+        return generate_ai_response(f'Chủ đề phỏng vấn: "{topic}".\n{prompt}', kind="repair",
+                                    response_schema=response_schema)
+    return repair
+
+
+# --- Prompt size budget ---
+# Prompts are measured before sending; over budget, older turns of the interview
+# history are folded into a rolling summary while recent turns stay verbatim.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "8000"))
+HISTORY_KEEP_RECENT = int(os.getenv("HISTORY_KEEP_RECENT", "4")) # Số lượt gần nhất giữ nguyên văn
+HISTORY_SUMMARY_MODE = os.getenv("HISTORY_SUMMARY_MODE", "heuristic") # "heuristic" hoặc "model"
+
+
+def summarize_history_with_ai(previous_summary, older_entries):
+    transcript = "\n".join(
+        f"{'Ứng viên' if entry['role'] == 'user' else 'Người phỏng vấn'}: {' '.join(entry['parts'])}"
+        for entry in older_entries
+    )
+    previous = f"Tóm tắt trước đó:\n{previous_summary}\n" if previous_summary else ""
+    prompt = f"""Tóm tắt ngắn gọn (tối đa 120 từ) phần phỏng vấn dưới đây: các câu hỏi đã hỏi, chất lượng câu trả lời của ứng viên và các nhận xét chính. Chỉ trả về bản tóm tắt.
+{previous}Phần phỏng vấn:
+{transcript}"""
+    return generate_ai_response(prompt, kind="summary")
+
+
+# admission_class: take an admission slot for the summary call. Only needed outside a
+# request or slot that was already admitted (batch runs); inside one the call shares it.
+def fit_history_to_budget(history, prompt, admission_class=None):
+    tokens_before = prompt_tokens(prompt, history)
+    summarize = None
+    if HISTORY_SUMMARY_MODE == "model":
+        summarize = summarize_history_with_ai
+        if admission_class:
+            def summarize(previous_summary, older_entries):
+                with admission_slot(admission_class):
+                    return summarize_history_with_ai(previous_summary, older_entries)
+    if compact_history(history, prompt, PROMPT_TOKEN_BUDGET, keep_recent=HISTORY_KEEP_RECENT, summarize=summarize):
+        log(f"Compacted interview history: ~{tokens_before} -> ~{prompt_tokens(prompt, history)} tokens")
+
+
+# Retryable failures (timeouts, quota, upstream 5xx) map to 503 so clients know to try again
+def ai_error_response(error):
+    status = 503 if error.retryable else 500
+    return {"error": str(error), "retryable": error.retryable}, status
+
+
+# Format one server-sent event (data is JSON encoded so newlines survive)
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events):
+    return Response(events, mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no", # Tell nginx-style proxies not to buffer the stream
+    })
+
+
+# --- Admission control ---
+# Every AI-backed route goes through a per-client token bucket and then a bounded
+# priority queue in front of a fixed number of running requests (per worker process).
+# Answers to running interviews are admitted before new interviews, which go before
+# research; when the queue is full the request is turned away at once with 429 +
+# Retry-After instead of tying up a worker thread.
+# The limiter and the queue live in each worker process. RATE_LIMIT_* are per client for
+# the whole server, so each of the WEB_CONCURRENCY workers (gunicorn reads the same
+# variable) enforces its share; ADMISSION_* and AI_MAX_CONCURRENCY stay per worker.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1"))) # Số worker process
+rate_limiter = RateLimiter(
+    rate_per_minute=float(os.getenv("RATE_LIMIT_PER_MINUTE", "30")) / WEB_CONCURRENCY, # 0 = tắt giới hạn theo client
+    burst=max(1, math.ceil(int(os.getenv("RATE_LIMIT_BURST", "10")) / WEB_CONCURRENCY)),
+)
+admission_queue = AdmissionQueue(
+    max_active=int(os.getenv("ADMISSION_MAX_ACTIVE", os.getenv("AI_MAX_CONCURRENCY", "8"))),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10")),
+)
+TRUST_PROXY = int(os.getenv("TRUST_PROXY", "0")) # Số reverse proxy phía trước app (dùng X-Forwarded-For); 0 = tắt
+metrics.Gauge("admission_active", "AI-backed requests currently running.", lambda: admission_queue.stats()["active"])
+metrics.Gauge("admission_waiting", "AI-backed requests waiting in the admission queue.",
+              lambda: admission_queue.stats()["waiting"])
+
+
+# Each proxy appends the address it received the request from, so with TRUST_PROXY
+# proxies the client is the TRUST_PROXY-th entry from the right. Entries further left
+# come from the client itself and could be forged to dodge the rate limit.
+def client_address():
+    if TRUST_PROXY:
+        forwarded = [addr.strip() for addr in request.headers.get("X-Forwarded-For", "").split(",")]
+        if len(forwarded) >= TRUST_PROXY and forwarded[-TRUST_PROXY]:
+            return forwarded[-TRUST_PROXY]
+    return request.remote_addr or "unknown"
+
+
+def overloaded_response(route_class, error):
+    ADMISSION_REJECTED.inc(route_class=route_class, reason=error.reason)
+    return jsonify({"error": str(error), "retryable": True}), error.status, {"Retry-After": str(error.retry_after)}
+
+
+# route_class: "answer", "start", "research", "batch" or "prefetch" (see AdmissionQueue.PRIORITIES).
+# The slot is held until the response is finished, including the whole SSE stream.
+def admitted(route_class):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            wait_start = time.perf_counter()
+            try:
+                rate_limiter.check(client_address())
+                acquired_at = admission_queue.acquire(route_class)
+            except Overloaded as e:
+                return overloaded_response(route_class, e)
+            ADMISSION_WAIT.observe(time.perf_counter() - wait_start, route_class=route_class)
+
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except BaseException:
+                admission_queue.release(acquired_at)
+                raise
+            if response.is_streamed:
+                response.call_on_close(lambda: admission_queue.release(acquired_at))
+            else:
+                admission_queue.release(acquired_at)
+            return response
+        return wrapper
+    return decorator
+
+
+# Rate limit only, for routes whose AI work takes admission slots later, outside the
+# request (batch runs, background jobs)
+def rate_limited(route_class):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                rate_limiter.check(client_address())
+            except Overloaded as e:
+                return overloaded_response(route_class, e)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# An admission slot for AI work that runs outside the request that asked for it
+# (batch grading threads, background jobs, question prefetch). Being turned away surfaces as a
+# retryable AIError, like an upstream overload.
+@contextlib.contextmanager
+def admission_slot(route_class):
+    wait_start = time.perf_counter()
     try:
-        # Gemini-2.0-flash might handle system instructions differently or prefer prompt format.
-        # Let's try providing the full context in the prompt itself.
-        chat = model.start_chat(history=history if history is not None else [])
-        response = chat.send_message(prompt)
-        # Sometimes content is blocked, check for response.text
-        if hasattr(response, 'text'):
-            return response.text.strip()
-        else:
-             print("AI response blocked or empty:", response)
-             # Check for safety ratings if response is blocked
-             if response.prompt_feedback and response.prompt_feedback.block_reason:
-                  print(f"Block reason: {response.prompt_feedback.block_reason}")
-                  return "Xin lỗi, yêu cầu của bạn bị chặn do nội dung không phù hợp."
-             elif response.candidates and response.candidates[0].finish_reason:
-                 print(f"Finish reason: {response.candidates[0].finish_reason}")
-                 return "Xin lỗi, tôi không thể tạo phản hồi hoàn chỉnh."
-             else:
-                 return "Xin lỗi, tôi không thể tạo phản hồi cho yêu cầu này."
-    except Exception as e:
-        print(f"AI API Error: {e}")
-        # Check for specific API errors if possible
-        return f"Đã xảy ra lỗi khi giao tiếp với AI: {e}"
+        acquired_at = admission_queue.acquire(route_class)
+    except Overloaded as e:
+        ADMISSION_REJECTED.inc(route_class=route_class, reason=e.reason)
+        raise AIUpstreamError(str(e), retryable=True)
+    ADMISSION_WAIT.observe(time.perf_counter() - wait_start, route_class=route_class)
+    try:
+        yield
+    finally:
+        admission_queue.release(acquired_at)
+
+
+@app.route('/admission/stats')
+def admission_stats():
+    return jsonify(admission_queue.stats())
+
+
+# --- Request instrumentation ---
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        elapsed = time.perf_counter() - start
+        # Label by route pattern (not the raw path) to keep label cardinality bounded
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        HTTP_REQUEST_DURATION.observe(elapsed, route=route, method=request.method, status=response.status_code)
+        log_event("http_request", route=route, method=request.method, status=response.status_code,
+                  duration_ms=round(elapsed * 1000, 1))
+    return response
+
+
+# Liveness: the process is up and serving requests
+@app.route('/healthz')
+def healthz():
+    return jsonify({"status": "ok"})
+
+
+# Readiness: this worker has an AI provider and the upstream model is reachable.
+# The first probe initializes the provider (and runs the optional warm-up call),
+# so a load balancer only routes traffic to warmed workers.
+@app.route('/readyz')
+def readyz():
+    provider = get_llm_provider()
+    if provider is None:
+        return jsonify({"status": "unavailable", "error": "Mô hình AI không khả dụng."}), 503
+
+    if time.monotonic() - _worker_ai["ready_at"] > READINESS_CACHE_SECONDS:
+        try:
+            provider.check(timeout=5)
+            if AI_WARMUP and _worker_ai["ready_at"] == 0.0:
+                generate_ai_response("Trả lời đúng một từ: OK", kind="warmup")
+        except Exception as e:
+            log(f"Readiness check failed: {e}")
+            return jsonify({"status": "unavailable", "error": str(e)}), 503
+        _worker_ai["ready_at"] = time.monotonic()
+
+    return jsonify({"status": "ready", "provider": provider.name})
+
+
+# Prometheus text format: per-route latency, AI call timing by prompt kind,
+# prompt/response token sizes, parse fallbacks and blocked/empty responses
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 # --- API Endpoints ---
@@ -100,25 +485,28 @@ def generate_ai_response(prompt, history=None):
 # Serve index.html
 @app.route('/')
 def index():
-    return send_from_directory('.', 'index.html')
+    return static_assets.response('index.html', request)
 
-# Serve static files
+# Serve static files (allowlist only, with ETag/304 and gzip/brotli)
 @app.route('/<path:filename>')
 def static_files(filename):
-    return send_from_directory('.', filename)
+    response = static_assets.response(filename, request)
+    if response is None:
+        abort(404)
+    return response
 
 
 @app.route('/interview/start', methods=['POST'])
+@admitted("start")
 def start_interview():
     data = request.json
     topic = data.get('topic')
     if not topic:
         return jsonify({"error": "Chưa chọn chủ đề phỏng vấn."}), 400
 
-    print(f"Starting interview on topic: {topic}")
+    log(f"Starting interview on topic: {topic}")
 
-    # Reset state
-    global interview_state
+    # Fresh state for this interview; it only gets a session once the first question exists
     interview_state = {
         "active": True,
         "topic": topic,
@@ -129,37 +517,208 @@ def start_interview():
         "score": 0
     }
 
-    # Generate first question
-    prompt = f"""Bạn là một chuyên gia phỏng vấn lập trình viên. Hãy tạo câu hỏi phỏng vấn đầu tiên về chủ đề "{topic}". Câu hỏi cần rõ ràng, súc tích và phù hợp với cấp độ trung bình. Sử dụng **định dạng đậm** cho các thuật ngữ quan trọng nếu cần. Chỉ trả về câu hỏi, không có lời giới thiệu hay kết thúc."""
-    first_question = generate_ai_response(prompt)
-
-    if "Đã xảy ra lỗi" in first_question or "không thể tạo phản hồi" in first_question or "bị chặn" in first_question:
-         interview_state["active"] = False # Deactivate if AI fails
-         return jsonify({"error": first_question}), 500
-
+    # First question: from the question bank (QUESTION_BANK_RATIO of the time), else the
+    # prefetch pool when one is ready, otherwise generated now
+    first_question = question_bank.take(topic, position="first")
+    source = "bank"
+    if first_question is None:
+        first_question = question_pool.take(topic)
+        source = "pool"
+    if first_question is None:
+        source = "live"
+        try:
+            first_question = generate_first_question(topic)
+        except AIError as e:
+            error_data, status = ai_error_response(e)
+            return jsonify(error_data), status # No session is created if AI fails
+    QUESTIONS_SERVED.inc(position="first", source=source)
+    if source != "bank":
+        question_bank.add(topic, first_question, position="first")
 
     interview_state["questions"].append(first_question)
+    interview_state["history"] = [{"role": "model", "parts": [f"Câu hỏi 1: {first_question}"]}]
+    session_id = session_store.create(interview_state)
 
     return jsonify({
+        "session_id": session_id,
         "question": first_question,
         "question_number": 1,
         "total_questions": MAX_QUESTIONS,
         "topic": topic
     })
 
+
+def generate_first_question(topic):
+    return generate_ai_response(build_first_question_prompt(topic), kind="first_question")
+
+
+@app.route('/interview/pool/stats')
+def question_pool_stats():
+    return jsonify(question_pool.stats())
+
+
+# Returns {"final_summary", "final_score"}; fallback_score is the internal score.
+# admission_class: take an admission slot for the AI calls (background jobs, which
+# run after the request that admitted them has finished)
+def generate_final_evaluation(topic, history, fallback_score, admission_class=None):
+    final_score_prompt = build_final_score_prompt(topic, json_output=AI_JSON_OUTPUT)
+    slot = admission_slot(admission_class) if admission_class else contextlib.nullcontext()
+    try:
+        with slot:
+            fit_history_to_budget(history, final_score_prompt) # A model summary runs under the same slot
+            final_evaluation_text = generate_ai_response(
+                final_score_prompt, history=history, kind="final_score", # Pass full history
+                response_schema=final_evaluation_schema() if AI_JSON_OUTPUT else None)
+            # AI generated score string, or the internal score as fallback
+            summary, final_score_str = parse_final_evaluation(final_evaluation_text, fallback_score,
+                                                              json_output=AI_JSON_OUTPUT,
+                                                              repair=repair_ai_response(topic))
+    except AIError as e:
+        # The answers are already graded; finish with the internal score rather than failing the interview
+        summary = f"Không thể tạo đánh giá cuối cùng: {e}"
+        final_score_str = fallback_score
+    return {"final_summary": summary, "final_score": final_score_str}
+
+
+@app.route('/interview/bank/stats')
+def question_bank_stats():
+    return jsonify(question_bank.stats())
+
+
 @app.route('/interview/answer', methods=['POST'])
+@admitted("answer")
 def submit_answer():
     data = request.json
     user_answer = data.get('answer')
+    session_id = data.get('session_id')
+
+    # Hold this interview's lock for the whole turn so concurrent submissions
+    # for the same session cannot interleave; other sessions are unaffected.
+    try:
+        with session_store.session(session_id) as interview_state:
+            return _process_answer(interview_state, user_answer)
+    except SessionConflict as e:
+        # Another worker process handled a request for this interview meanwhile: nothing was saved
+        return jsonify({"error": str(e), "retryable": True}), 409
+
+
+# Same turn as /interview/answer, streamed as server-sent events:
+#   event: feedback -> {"feedback": ...} as soon as the FEEDBACK section is complete
+#                      (not sent with AI_JSON_OUTPUT: the JSON is only parsed at the end)
+#   event: result   -> the same JSON body /interview/answer would return
+#   event: error    -> {"error": ...}
+@app.route('/interview/answer/stream', methods=['POST'])
+@admitted("answer")
+def submit_answer_stream():
+    data = request.json
+    user_answer = data.get('answer')
+    session_id = data.get('session_id')
+
+    def events():
+        # The result is sent after the session is written back: a SessionConflict on
+        # write must turn into an error event, not follow a result that was never saved
+        final_event = None
+        try:
+            with session_store.session(session_id) as interview_state:
+                turn, error = _begin_turn(interview_state, user_answer)
+                if error is not None:
+                    final_event = sse_event("error", error[0])
+                    return
+                feedback_and_next_prompt, history_for_ai = turn
+
+                ai_response_text = ""
+                feedback_sent = AI_JSON_OUTPUT
+                turn_open = True # The answer recorded by _begin_turn is undone unless the turn completes
+                try:
+                    try:
+                        for chunk in generate_ai_response_stream(feedback_and_next_prompt, history=history_for_ai, kind="feedback",
+                                                                 response_schema=_feedback_schema(interview_state)):
+                            ai_response_text += chunk
+                            if not feedback_sent:
+                                feedback = completed_section(ai_response_text, "FEEDBACK")
+                                if feedback is not None:
+                                    feedback_sent = True
+                                    yield sse_event("feedback", {"feedback": feedback})
+                    except AIError as e:
+                        _abort_turn(interview_state) # Keep the interview alive so the answer can be resent
+                        turn_open = False
+                        final_event = sse_event("error", ai_error_response(e)[0])
+                        return
+
+                    response_data, status = _complete_turn(interview_state, ai_response_text.strip(), history_for_ai)
+                    turn_open = False
+                    final_event = sse_event("result" if status == 200 else "error", response_data)
+                finally:
+                    if turn_open:
+                        # The client went away mid-stream (GeneratorExit): same as a failed AI call
+                        _abort_turn(interview_state)
+        except SessionConflict as e:
+            final_event = sse_event("error", {"error": str(e), "retryable": True})
+        finally:
+            if final_event is not None:
+                yield final_event
+
+    return sse_response(events())
+
+
+def _process_answer(interview_state, user_answer):
+    turn, error = _begin_turn(interview_state, user_answer)
+    if error is not None:
+        error_data, status = error
+        return jsonify(error_data), status
+    feedback_and_next_prompt, history_for_ai = turn
 
-    if not interview_state["active"]:
-         return jsonify({"error": "Cuộc phỏng vấn chưa được bắt đầu hoặc đã kết thúc."}), 400
+    try:
+        ai_response_text = generate_ai_response(feedback_and_next_prompt, history=history_for_ai, kind="feedback",
+                                                response_schema=_feedback_schema(interview_state))
+    except AIError as e:
+        _abort_turn(interview_state) # Keep the interview alive so the answer can be resent
+        error_data, status = ai_error_response(e)
+        return jsonify(error_data), status
+
+    response_data, status = _complete_turn(interview_state, ai_response_text, history_for_ai)
+    return jsonify(response_data), status
+
+
+# Undo _begin_turn after a failed AI call: forget the recorded answer so the
+# same question can be answered again instead of ending the interview.
+def _abort_turn(interview_state):
+    interview_state["answers"].pop()
+    interview_state["history"].pop()
+    interview_state.pop("banked_question", None)
+
+
+# Chat history for the AI, in Gemini's {"role", "parts"} format:
+#   model: "Câu hỏi 1: ..."            (first question)
+#   user:  answer 1
+#   model: "Phản hồi: ...\nCâu hỏi 2: ..." (feedback + next question)
+#   user:  answer 2 ...
+def _conversation_history(interview_state):
+    if "history" not in interview_state:
+        # Sessions saved before the history was stored: rebuild it once from the transcript
+        history = []
+        for i, question in enumerate(interview_state["questions"]):
+            model_turn = f"Câu hỏi {i+1}: {question}"
+            if i > 0 and i - 1 < len(interview_state["feedback"]):
+                model_turn = f"Phản hồi: {interview_state['feedback'][i-1]}\n" + model_turn
+            history.append({"role": "model", "parts": [model_turn]})
+            if i < len(interview_state["answers"]) and i < interview_state["current_question_index"]:
+                history.append({"role": "user", "parts": [interview_state["answers"][i]]})
+        interview_state["history"] = history
+    return interview_state["history"]
+
+
+# Validate the session, record the answer and build the feedback+next-question prompt.
+# Returns ((prompt, history), None) on success or (None, (error_data, http_status)) otherwise.
+def _begin_turn(interview_state, user_answer):
+    if not interview_state or not interview_state["active"]:
+         return None, ({"error": "Cuộc phỏng vấn chưa được bắt đầu hoặc đã kết thúc."}, 400)
 
     topic = interview_state["topic"]
     current_index = interview_state["current_question_index"]
     # Ensure we don't go out of bounds if state is inconsistent
     if current_index >= len(interview_state["questions"]):
-         return jsonify({"error": "Lỗi trạng thái phỏng vấn. Vui lòng bắt đầu lại."}), 500
+         return None, ({"error": "Lỗi trạng thái phỏng vấn. Vui lòng bắt đầu lại."}, 500)
 
     current_question = interview_state["questions"][current_index]
 
@@ -170,137 +729,54 @@ def submit_answer():
 
     interview_state["answers"].append(user_answer)
 
-    print(f"Processing answer for Q{current_index + 1}: {user_answer}")
+    log(f"Processing answer for Q{current_index + 1}: {user_answer}")
 
     # --- AI Process Answer, Feedback, and Next Question ---
-    # Build history for better context
-    # Reconstruct history for the AI to understand the conversation flow
-    history_for_ai = []
-    for i in range(current_index):
-        # AI asks question (model role in history)
-        history_for_ai.append({"role": "model", "parts": [f"Câu hỏi {i+1}: {interview_state['questions'][i]}"]})
-        # User answers (user role in history)
-        history_for_ai.append({"role": "user", "parts": [interview_state["answers"][i]]})
-        # AI provides feedback and next question (model role) - Combine for history
-        # Format this part clearly for the AI
-        if i < len(interview_state["feedback"]) and i + 1 < len(interview_state["questions"]):
-             combined_model_turn = f"Phản hồi: {interview_state['feedback'][i]}\n"
-             combined_model_turn += f"Câu hỏi {i+2}: {interview_state['questions'][i+1]}"
-             history_for_ai.append({"role": "model", "parts": [combined_model_turn]})
-
-
-    # Add the current turn to history
-    # AI asks the current question
-    history_for_ai.append({"role": "model", "parts": [f"Câu hỏi {current_index + 1}: {current_question}"]})
+    # The conversation is kept as an append-only history in the session, so a turn
+    # only appends the new answer instead of rebuilding every previous turn.
+    history_for_ai = _conversation_history(interview_state)
     # User provides the current answer
     history_for_ai.append({"role": "user", "parts": [user_answer]})
 
 
-    feedback_and_next_prompt = f"""
-Bạn là chuyên gia phỏng vấn. Dựa trên lịch sử phỏng vấn và câu trả lời gần nhất của ứng viên ("{user_answer}") cho câu hỏi ("{current_question}"), hãy:
-1. Đánh giá câu trả lời: Cung cấp phản hồi ngắn gọn (khoảng 2-3 dòng) về điểm mạnh, điểm cần cải thiện hoặc mức độ phù hợp. Sử dụng **định dạng đậm** cho các thuật ngữ quan trọng.
-2. Chuẩn bị câu hỏi tiếp theo: Nếu đây là câu hỏi thứ {current_index + 1} (trong tổng số {MAX_QUESTIONS} câu), hãy tạo câu hỏi thứ {current_index + 2} (nếu chưa đủ {MAX_QUESTIONS} câu) về chủ đề "{topic}", dựa trên câu trả lời vừa rồi hoặc một khía cạnh khác của chủ đề. Sử dụng **định dạng đậm** cho các thuật ngữ quan trọng.
-3. Định dạng phản hồi của bạn theo cấu trúc sau (sử dụng dấu phân cách rõ ràng):
----FEEDBACK---
-[Phản hồi đánh giá câu trả lời ở đây]
----NEXT_QUESTION---
-[Câu hỏi tiếp theo ở đây, hoặc thông báo "END_INTERVIEW" nếu đã đủ 10 câu]
----SCORE_HINT---
-[Gợi ý ngắn gọn (1-2 từ) về mức độ đánh giá cho câu trả lời này (ví dụ: "Good", "OK", "Needs Improvement"). Dùng tiếng Anh để dễ xử lý hơn. Đừng giải thích.]
-"""
-
-    ai_response_text = generate_ai_response(feedback_and_next_prompt, history=history_for_ai)
-
-    if "Đã xảy ra lỗi" in ai_response_text or "không thể tạo phản hồi" in ai_response_text or "bị chặn" in ai_response_text:
-         interview_state["active"] = False # Deactivate if AI fails
-         return jsonify({"error": ai_response_text}), 500
-
-
-    # Parse AI response
-    feedback = "Không có phản hồi từ AI."
-    next_question = "END_INTERVIEW"
-    score_hint = "Neutral" # Default hint
-
-    parts = ai_response_text.split("---")
-    parsed_feedback = "Không có phản hồi từ AI."
-    parsed_next_question = "END_INTERVIEW"
-    parsed_score_hint = "Neutral"
+    # The next question may come from the bank; the AI then only has to write feedback
+    banked_question = None
+    if current_index + 1 < MAX_QUESTIONS:
+        banked_question = question_bank.take(topic, asked=interview_state["questions"])
+    interview_state["banked_question"] = banked_question
+    feedback_and_next_prompt = build_feedback_prompt(topic, current_question, user_answer, current_index,
+                                                     MAX_QUESTIONS, next_question=banked_question,
+                                                     json_output=AI_JSON_OUTPUT)
 
-    try:
-        # Clean up parts and map to variables
-        part_map = {}
-        current_key = None
-        current_value_lines = []
-
-        for part in parts:
-            part = part.strip()
-            if part in ["FEEDBACK", "NEXT_QUESTION", "SCORE_HINT"]:
-                if current_key is not None:
-                    part_map[current_key] = "\n".join(current_value_lines).strip()
-                current_key = part
-                current_value_lines = []
-            elif current_key is not None:
-                current_value_lines.append(part)
-
-        # Capture the last part
-        if current_key is not None:
-             part_map[current_key] = "\n".join(current_value_lines).strip()
-
-        parsed_feedback = part_map.get("FEEDBACK", parsed_feedback)
-        parsed_next_question = part_map.get("NEXT_QUESTION", parsed_next_question)
-        parsed_score_hint = part_map.get("SCORE_HINT", parsed_score_hint)
-
-    except Exception as e:
-        print(f"Error parsing AI response format: {e}")
-        print("AI response text:", ai_response_text)
-        # Fallback - try to extract parts less strictly if parse fails
-        feedback_start = ai_response_text.find("---FEEDBACK---")
-        next_q_start = ai_response_text.find("---NEXT_QUESTION---")
-        score_start = ai_response_text.find("---SCORE_HINT---")
-
-        if feedback_start != -1:
-             feedback_end = next_q_start if next_q_start != -1 else (score_start if score_start != -1 else len(ai_response_text))
-             parsed_feedback = ai_response_text[feedback_start + len("---FEEDBACK---"):feedback_end].strip()
+    fit_history_to_budget(history_for_ai, feedback_and_next_prompt)
+    return (feedback_and_next_prompt, history_for_ai), None
 
-        if next_q_start != -1:
-             next_q_end = score_start if score_start != -1 else len(ai_response_text)
-             parsed_next_question = ai_response_text[next_q_start + len("---NEXT_QUESTION---"):next_q_end].strip()
 
-        if score_start != -1:
-             parsed_score_hint = ai_response_text[score_start + len("---SCORE_HINT---"):].strip()
+# JSON schema for this turn's feedback call, or None in the delimited format
+def _feedback_schema(interview_state):
+    if not AI_JSON_OUTPUT:
+        return None
+    return feedback_schema(expect_next_question=interview_state.get("banked_question") is None)
 
-        # If even fallback parsing fails, use error message
-        if "---FEEDBACK---" not in ai_response_text: # Simple check for basic structure
-             parsed_feedback = f"Lỗi xử lý phản hồi từ AI: {e}. Phản hồi gốc:\n{ai_response_text}"
-             parsed_next_question = "END_INTERVIEW" # Force end on severe parse error
-             parsed_score_hint = "Error"
 
+# Parse the AI output for one turn, update score/state and, on the last turn,
+# generate the final evaluation. Returns (response_data, http_status).
+def _complete_turn(interview_state, ai_response_text, history_for_ai):
+    topic = interview_state["topic"]
+    current_index = interview_state["current_question_index"]
+    user_answer = interview_state["answers"][-1]
 
-    # Use parsed values
-    feedback = parsed_feedback
-    next_question = parsed_next_question
-    score_hint = parsed_score_hint
+    banked_question = interview_state.pop("banked_question", None)
+    feedback, next_question, score_hint = parse_feedback_response(
+        ai_response_text, expect_next_question=banked_question is None, json_output=AI_JSON_OUTPUT,
+        repair=repair_ai_response(topic))
+    if banked_question is not None:
+        next_question = banked_question
 
 
     interview_state["feedback"].append(feedback)
 
-    # Simple scoring based on hint (adjust points as needed)
-    lower_score_hint = score_hint.lower()
-    if "good" in lower_score_hint or "excellent" in lower_score_hint or "strong" in lower_score_hint:
-        interview_state["score"] += 10
-    elif "ok" in lower_score_hint or "average" in lower_score_hint or "decent" in lower_score_hint:
-        interview_state["score"] += 7
-    elif "improvement" in lower_score_hint or "weak" in lower_score_hint or "needs work" in lower_score_hint:
-        interview_state["score"] += 3
-    elif "partial" in lower_score_hint:
-        interview_state["score"] += 5
-     # Award some points even for empty answers if feedback is neutral/OK (optional logic)
-    elif user_answer.strip() == "" and ("neutral" in lower_score_hint or "ok" in lower_score_hint):
-         interview_state["score"] += 1 # Small penalty for no answer
-    # Add more scoring logic if needed for other hints
-    # Handle 'Error' hint: no points added, potentially subtract?
-    elif "error" in lower_score_hint:
-         pass # Don't add points for errors
+    interview_state["score"] += score_points(score_hint, user_answer)
 
 
     response_data = {
@@ -315,99 +791,242 @@ Bạn là chuyên gia phỏng vấn. Dựa trên lịch sử phỏng vấn và c
     # Check if it's time to finish based on index or AI signal
     if interview_state["current_question_index"] >= MAX_QUESTIONS or next_question.strip().upper() == "END_INTERVIEW":
         # --- Generate Final Score ---
-        final_score_prompt = f"""
-        Bạn là chuyên gia đánh giá kết quả phỏng vấn. Dựa trên chủ đề "{topic}" và toàn bộ lịch sử phỏng vấn (có sẵn trong bộ nhớ của bạn từ cuộc trò chuyện này), hãy cung cấp:
-        1. Một đánh giá tổng quan ngắn gọn (khoảng 3-5 dòng) về hiệu suất của ứng viên trong suốt cuộc phỏng vấn. Sử dụng **định dạng đậm** cho các điểm nổi bật.
-        2. Một điểm số cuối cùng. Thang điểm tùy ý bạn (ví dụ: X/100, A-F, Pass/Fail), nhưng phải có con số hoặc ký hiệu rõ ràng thể hiện mức độ.
-        3. Định dạng kết quả theo cấu trúc:
-        ---SUMMARY---
-        [Đánh giá tổng quan ở đây]
-        ---FINAL_SCORE---
-        [Điểm số cuối cùng (chỉ con số hoặc chuỗi điểm - VD: 75/100, B+, Pass)]
-        """
         # We don't pass history here again explicitly in the prompt body,
-        # as the AI should retain history in the chat session.
-        final_evaluation_text = generate_ai_response(final_score_prompt, history=history_for_ai) # Pass full history
+        # as the AI gets the same session history, closed with the last feedback.
+        history_for_ai.append({"role": "model", "parts": [f"Phản hồi: {feedback}"]})
+        response_data["status"] = "finished"
+        fallback_score = f"{interview_state['score']}/?"
+        job_id = None
+        if FINAL_EVALUATION_ASYNC:
+            # Return the last feedback now; the client polls /jobs/<final_job_id> for the evaluation.
+            # The job compacts its own copy of the history, after this request has released the session.
+            final_history = [dict(entry) for entry in history_for_ai]
+            try:
+                job_id = job_manager.submit("final_evaluation", lambda: generate_final_evaluation(
+                    topic, final_history, fallback_score, admission_class="answer"))
+            except Overloaded:
+                log("Job queue full, generating the final evaluation in the request.")
+        if job_id is not None:
+            interview_state["final_job_id"] = job_id
+            response_data["final_job_id"] = job_id
+        else:
+            response_data.update(generate_final_evaluation(topic, history_for_ai, fallback_score))
 
+        # Mark the session finished; the store drops it after the idle timeout
+        interview_state["active"] = False
 
-        summary = "Không có tóm tắt từ AI."
-        final_score_str = f"{interview_state['score']}/?" # Fallback using internal score
+    else:
+        # Continue, add the generated question to state
+        interview_state["questions"].append(next_question)
+        QUESTIONS_SERVED.inc(position="next", source="bank" if banked_question is not None else "live")
+        if banked_question is None:
+            question_bank.add(topic, next_question)
+        history_for_ai.append({"role": "model", "parts": [f"Phản hồi: {feedback}\nCâu hỏi {current_index + 2}: {next_question}"]})
+        response_data["next_question"] = next_question
+        response_data["status"] = "continue"
 
-        parts = final_evaluation_text.split("---")
-        parsed_summary = "Không có tóm tắt từ AI."
-        parsed_final_score = f"{interview_state['score']}/?"
 
+    return response_data, 200
+
+
+# --- Batch re-grading of recorded transcripts ---
+# POST a JSONL body (one transcript per line, see batch_grading.py); results stream
+# back as JSONL while the transcripts are graded on a bounded pool. With ?run_id=...
+# (and BATCH_CHECKPOINT_DIR set) finished results are checkpointed, so repeating the
+# request after an interruption only grades what is missing.
+# Every AI call of a run takes an admission slot at the lowest priority, and only
+# BATCH_MAX_RUNS runs are accepted at once per worker, so batches cannot crowd out
+# interviews or get around the per-client rate limit.
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+BATCH_MAX_RUNS = int(os.getenv("BATCH_MAX_RUNS", "1")) # Số lượt chấm hàng loạt chạy đồng thời
+BATCH_CHECKPOINT_DIR = os.getenv("BATCH_CHECKPOINT_DIR") # Để trống = không lưu checkpoint
+_active_batch_runs = set()
+_batch_runs = {"running": 0}
+_batch_runs_lock = threading.Lock()
+
+
+def generate_batch_response(prompt, history=None, kind=None, response_schema=None):
+    with admission_slot("batch"):
+        return generate_ai_response(prompt, history=history, kind=kind, response_schema=response_schema)
+
+
+def fit_history_batch(history, prompt):
+    fit_history_to_budget(history, prompt, admission_class="batch")
+
+
+@app.route('/interview/evaluate_batch', methods=['POST'])
+@rate_limited("batch")
+def evaluate_batch():
+    run_id = request.args.get('run_id')
+    if run_id:
+        if not BATCH_CHECKPOINT_DIR:
+            return jsonify({"error": "Server chưa cấu hình BATCH_CHECKPOINT_DIR để lưu checkpoint."}), 400
+        if not run_id.replace("-", "").replace("_", "").isalnum() or len(run_id) > 64:
+            return jsonify({"error": "run_id chỉ gồm chữ, số, '-' và '_' (tối đa 64 ký tự)."}), 400
+    with _batch_runs_lock:
+        if run_id and run_id in _active_batch_runs:
+            return jsonify({"error": "Lượt chấm này đang chạy."}), 409
+        if _batch_runs["running"] >= BATCH_MAX_RUNS:
+            return overloaded_response("batch", Overloaded(
+                "Đang có lượt chấm hàng loạt khác chạy. Vui lòng thử lại sau.", retry_after=60))
+        _batch_runs["running"] += 1
+        if run_id:
+            _active_batch_runs.add(run_id)
+
+    checkpoint = None
+
+    # On close rather than in the generator: it also runs if the stream never started
+    def end_run():
+        if checkpoint is not None:
+            checkpoint.close()
+        with _batch_runs_lock:
+            _batch_runs["running"] -= 1
+            _active_batch_runs.discard(run_id)
+
+    if run_id:
         try:
-             # Clean up parts and map to variables
-             part_map = {}
-             current_key = None
-             current_value_lines = []
-
-             for part in parts:
-                 part = part.strip()
-                 if part in ["SUMMARY", "FINAL_SCORE"]:
-                     if current_key is not None:
-                         part_map[current_key] = "\n".join(current_value_lines).strip()
-                     current_key = part
-                     current_value_lines = []
-                 elif current_key is not None:
-                     current_value_lines.append(part)
-
-             # Capture the last part
-             if current_key is not None:
-                  part_map[current_key] = "\n".join(current_value_lines).strip()
-
-             parsed_summary = part_map.get("SUMMARY", parsed_summary)
-             parsed_final_score = part_map.get("FINAL_SCORE", parsed_final_score)
+            os.makedirs(BATCH_CHECKPOINT_DIR, exist_ok=True)
+            checkpoint = Checkpoint(os.path.join(BATCH_CHECKPOINT_DIR, f"{run_id}.jsonl"))
+        except BaseException:
+            end_run()
+            raise
 
-        except Exception as e:
-             print(f"Error parsing final evaluation: {e}")
-             print("Final evaluation text:", final_evaluation_text)
-             # Fallback - try basic extraction
-             summary_start = final_evaluation_text.find("---SUMMARY---")
-             score_start = final_evaluation_text.find("---FINAL_SCORE---")
-
-             if summary_start != -1:
-                 summary_end = score_start if score_start != -1 else len(final_evaluation_text)
-                 parsed_summary = final_evaluation_text[summary_start + len("---SUMMARY---"):summary_end].strip()
+    lines = request.stream
 
-             if score_start != -1:
-                 parsed_final_score = final_evaluation_text[score_start + len("---FINAL_SCORE---"):].strip()
+    def results():
+        for result in grade_batch(lines, generate_batch_response, fit_history_batch, MAX_QUESTIONS,
+                                  BATCH_WORKERS, checkpoint):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
 
-             if "---SUMMARY---" not in final_evaluation_text: # Basic check
-                 parsed_summary = f"Lỗi xử lý kết quả cuối cùng từ AI: {e}.\nPhản hồi gốc:\n{final_evaluation_text}"
+    response = Response(stream_with_context(results()), mimetype='application/x-ndjson',
+                        headers={"X-Accel-Buffering": "no"})
+    response.call_on_close(end_run)
+    return response
 
 
-        summary = parsed_summary
-        final_score_str = final_score_str # Use AI generated score string (or fallback)
-
+@app.route('/research', methods=['POST'])
+@admitted("research")
+def perform_research():
+    data = request.json
+    topic = data.get('topic')
+    if not topic:
+        return jsonify({"error": "Chưa nhập chủ đề nghiên cứu."}), 400
 
-        response_data["status"] = "finished"
-        response_data["final_summary"] = summary
-        response_data["final_score"] = final_score_str # Use AI generated score string
+    log(f"Performing research on topic: {topic}")
 
-        # Reset state after finishing
-        interview_state["active"] = False
+    research_prompt = build_research_prompt(topic)
+    try:
+        # Identical topics (after normalization) share one report and one in-flight Gemini call
+        research_report = research_cache.get_or_compute(topic, lambda: generate_ai_response(research_prompt, kind="research"))
+    except AIError as e:
+        error_data, status = ai_error_response(e)
+        return jsonify(error_data), status
 
-    else:
-        # Continue, add the generated question to state
-        interview_state["questions"].append(next_question)
-        response_data["next_question"] = next_question
-        response_data["status"] = "continue"
+    return jsonify({"report": research_report})
 
 
-    return jsonify(response_data)
+@app.route('/research/cache/stats')
+def research_cache_stats():
+    return jsonify(research_cache.stats())
 
+# Same report as /research, streamed as server-sent events:
+#   event: delta -> {"text": ...} for every chunk Gemini produces
+#   event: done  -> {"report": ...} with the full text
+#   event: error -> {"error": ...}
+@app.route('/research/stream', methods=['POST'])
+@admitted("research")
+def perform_research_stream():
+    data = request.json
+    topic = data.get('topic')
+    if not topic:
+        return jsonify({"error": "Chưa nhập chủ đề nghiên cứu."}), 400
 
-@app.route('/research', methods=['POST'])
-def perform_research():
+    log(f"Performing streamed research on topic: {topic}")
+    research_prompt = build_research_prompt(topic)
+
+    # Concurrent requests for the same uncached topic share one Gemini call: the
+    # first one streams it, the others wait and get the finished report at once.
+    def events():
+        while True:
+            report, flight, leader = research_cache.claim(topic)
+            if leader:
+                break
+            if report is None:
+                try:
+                    report = research_cache.wait(flight)
+                except AIError as e:
+                    yield sse_event("error", ai_error_response(e)[0])
+                    return
+            if report is not None:
+                # Nothing to stream: send the whole report at once
+                yield sse_event("delta", {"text": report})
+                yield sse_event("done", {"report": report})
+                return
+            # The leading client went away before its report was finished: take over
+
+        research_report = ""
+        finished = False
+        try:
+            try:
+                for chunk in generate_ai_response_stream(research_prompt, kind="research"):
+                    research_report += chunk
+                    yield sse_event("delta", {"text": chunk})
+            except AIError as e:
+                research_cache.finish(topic, flight, error=e)
+                finished = True
+                yield sse_event("error", ai_error_response(e)[0])
+                return
+            research_cache.finish(topic, flight, report=research_report.strip())
+            finished = True
+            yield sse_event("done", {"report": research_report.strip()})
+        finally:
+            if not finished:
+                research_cache.finish(topic, flight) # Let a waiting request take over
+
+    return sse_response(events())
+
+
+# Start a research report as a background job: returns {"job_id"} at once, and
+# GET /jobs/<job_id> later returns {"status": "done", "result": {"report": ...}}
+@app.route('/research/jobs', methods=['POST'])
+@rate_limited("research")
+def start_research_job():
     data = request.json
     topic = data.get('topic')
     if not topic:
         return jsonify({"error": "Chưa nhập chủ đề nghiên cứu."}), 400
 
-    print(f"Performing research on topic: {topic}")
+    log(f"Starting research job on topic: {topic}")
+    research_prompt = build_research_prompt(topic)
+
+    # The Gemini call takes an admission slot when the job runs (cache hits and waiters need none)
+    def compute():
+        with admission_slot("research"):
+            return generate_ai_response(research_prompt, kind="research")
+
+    try:
+        job_id = job_manager.submit("research", lambda: {"report": research_cache.get_or_compute(topic, compute)})
+    except Overloaded as e:
+        return overloaded_response("research", e)
+    return jsonify({"job_id": job_id}), 202
+
+
+# Job status/result. ?wait=N (up to 30s) holds the request until the job finishes,
+# so clients can long-poll instead of polling in a tight loop.
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    try:
+        wait = min(30.0, max(0.0, float(request.args.get('wait', 0))))
+    except ValueError:
+        wait = 0.0
+    record = job_manager.get(job_id, wait=wait)
+    if record is None:
+        return jsonify({"error": "Không tìm thấy tác vụ hoặc tác vụ đã hết hạn."}), 404
+    record.pop("pid", None) # Internal bookkeeping
+    return jsonify(record)
+
 
+def build_research_prompt(topic):
     # --- AI Research Simulation ---
     # The AI doesn't browse the web in real-time via this API.
     # It uses its training data to summarize information it knows. 
@@ -416,16 +1035,15 @@ def perform_research():
     research_prompt = f"""
     Bạn là một nhà nghiên cứu chuyên nghiệp. Hãy tổng hợp thông tin và tạo một báo cáo chi tiết (khoảng 300-500 từ) về chủ đề "{topic}". Báo cáo cần bao gồm các điểm chính, ứng dụng (nếu có), thách thức hoặc xu hướng liên quan. Trình bày báo cáo một cách rõ ràng, có cấu trúc, sử dụng các định dạng Markdown như **đậm**, *nghiêng*, dấu gạch đầu dòng (-) cho danh sách, và code block (```) nếu cần cho ví dụ kỹ thuật. Chỉ trả về nội dung báo cáo, không có lời giới thiệu "Đây là báo cáo của bạn" hay kết thúc.
     """
+    return research_prompt
 
-    research_report = generate_ai_response(research_prompt)
-
-    if "Đã xảy ra lỗi" in research_report or "không thể tạo phản hồi" in research_report or "bị chặn" in research_report:
-         return jsonify({"error": research_report}), 500
-
-    return jsonify({"report": research_report})
 
 if __name__ == '__main__':
     # Chạy Flask server
     # host='0.0.0.0' để có thể truy cập từ mạng nội bộ
     # debug=True để tự động load lại khi code thay đổi (chỉ dùng khi phát triển)
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    debug = True
+    # With the reloader the parent process only watches files; prefetch in the child that serves requests
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        question_pool.start() # Bắt đầu tạo trước câu hỏi đầu tiên cho các chủ đề có sẵn
+    app.run(debug=debug, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""Offline re-grading of recorded interview transcripts.
+
+Input is JSONL, one completed interview per line:
+
+    {"id": "abc", "topic": "Docker", "questions": ["...", "..."], "answers": ["...", "..."]}
+
+Each answer is graded with the same feedback prompt /interview/answer uses for a
+banked next question (the recorded question is given, so the model only writes
+feedback), then the interview gets the same final-score prompt. Results are JSONL, in completion order:
+
+    {"id": "abc", "status": "ok", "topic": ..., "turns": [...], "score": 17,
+     "final_summary": ..., "final_score": "72/100"}
+    {"id": "xyz", "status": "error", "error": ..., "retryable": true}
+
+Command line (uses the app's configuration, e.g. LLM_PROVIDER and GOOGLE_API_KEY):
+
+    python batch_grading.py transcripts.jsonl -o results.jsonl --workers 8
+
+The output file is also the checkpoint: running the same command again skips
+transcripts already in it and appends the rest. Retryable failures (timeouts,
+quota) are reported on stderr but not written, so the next run retries them.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from interview_prompts import (build_feedback_prompt, build_final_score_prompt, parse_feedback_response,
+                               parse_final_evaluation, score_points)
+from llm_client import AIError
+
+
+class TranscriptError(ValueError):
+    pass
+
+
+# --- Grading one transcript ---
+# generate(prompt, history=..., kind=...) -> text, raising AIError (app.generate_ai_response).
+# fit_history(history, prompt) may compact the history in place (app.fit_history_to_budget).
+def grade_transcript(transcript, generate, fit_history=None, total_questions=10):
+    topic, questions, answers = _validate(transcript)
+    answered = min(len(questions), len(answers))
+    # Malformed output gets one history-free re-prompt before defaults are used
+    def repair(prompt, response_schema):
+        return generate(f'Chủ đề phỏng vấn: "{topic}".\n{prompt}', kind="repair")
+
+    history = [{"role": "model", "parts": [f"Câu hỏi 1: {questions[0]}"]}]
+    turns = []
+    score = 0
+    for i in range(answered):
+        user_answer = answers[i] or ""
+        history.append({"role": "user", "parts": [user_answer]})
+        # The recorded next question is known: ask only for feedback (as for banked questions)
+        next_question = questions[i + 1] if i + 1 < len(questions) else None
+        prompt = build_feedback_prompt(topic, questions[i], user_answer, i, total_questions,
+                                       next_question=next_question)
+        if fit_history is not None:
+            fit_history(history, prompt)
+        # A proposed next question (last turn only) is not used, so it is not worth a repair
+        feedback, _, score_hint = parse_feedback_response(generate(prompt, history=history, kind="feedback"),
+                                                          expect_next_question=False, repair=repair)
+        score += score_points(score_hint, user_answer)
+        turns.append({"question_number": i + 1, "feedback": feedback, "score_hint": score_hint})
+
+        model_turn = f"Phản hồi: {feedback}"
+        if i + 1 < answered:
+            model_turn += f"\nCâu hỏi {i + 2}: {questions[i + 1]}" # The recorded question, not the model's
+        history.append({"role": "model", "parts": [model_turn]})
+
+    result = {"id": transcript["id"], "status": "ok", "topic": topic, "turns": turns, "score": score}
+    if answered:
+        prompt = build_final_score_prompt(topic)
+        if fit_history is not None:
+            fit_history(history, prompt)
+        final_evaluation_text = generate(prompt, history=history, kind="final_score")
+        result["final_summary"], result["final_score"] = parse_final_evaluation(final_evaluation_text, f"{score}/?",
+                                                                                repair=repair)
+    return result
+
+
+def _validate(transcript):
+    topic = transcript.get("topic")
+    questions = transcript.get("questions")
+    answers = transcript.get("answers", [])
+    if not isinstance(topic, str) or not topic:
+        raise TranscriptError("Thiếu chủ đề (topic).")
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) for q in questions):
+        raise TranscriptError("Thiếu danh sách câu hỏi (questions).")
+    if not isinstance(answers, list) or not all(a is None or isinstance(a, str) for a in answers):
+        raise TranscriptError("Danh sách câu trả lời (answers) không hợp lệ.")
+    return topic, questions, answers
+
+
+# --- Checkpoint ---
+# Finished results, one JSON line each, appended and flushed as they complete.
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self._done = {} # transcript id -> result
+        self._lock = threading.Lock()
+        needs_newline = False
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    needs_newline = not line.endswith("\n")
+                    try:
+                        result = json.loads(line)
+                    except ValueError:
+                        continue # Half-written line from an interrupted run
+                    self._done[result.get("id")] = result
+        self._file = open(path, "a", encoding="utf-8")
+        if needs_newline:
+            self._file.write("\n")
+
+    def __len__(self):
+        return len(self._done)
+
+    def get(self, transcript_id):
+        return self._done.get(transcript_id)
+
+    def record(self, result):
+        with self._lock:
+            self._done[result["id"]] = result
+            self._file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# --- Batch ---
+def grade_batch(lines, generate, fit_history=None, total_questions=10, max_workers=4,
+                checkpoint=None, replay=True):
+    """Grade JSONL transcript lines on a bounded pool, yielding results as they finish.
+
+    Input is consumed lazily (at most 2 * max_workers transcripts are in memory),
+    so arbitrarily long streams work. Transcripts already in the checkpoint are
+    not graded again; with replay=True their stored result is yielded instead.
+    """
+    def grade(transcript_id, line):
+        try:
+            transcript = json.loads(line)
+            if not isinstance(transcript, dict):
+                raise TranscriptError("Mỗi dòng phải là một đối tượng JSON.")
+            transcript["id"] = transcript_id
+            result = grade_transcript(transcript, generate, fit_history, total_questions)
+        except (ValueError, AIError) as e:
+            retryable = getattr(e, "retryable", False)
+            result = {"id": transcript_id, "status": "error", "error": str(e), "retryable": retryable}
+        # Retryable failures are left out of the checkpoint so a resumed run tries them again
+        if checkpoint is not None and not result.get("retryable"):
+            checkpoint.record(result)
+        return result
+
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch") as executor:
+        for line_number, line in enumerate(lines, start=1):
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            if not line.strip():
+                continue
+            transcript_id = _transcript_id(line, line_number)
+            done = checkpoint.get(transcript_id) if checkpoint is not None else None
+            if done is not None:
+                if replay:
+                    yield done
+                continue
+            if len(pending) >= 2 * max_workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield future.result()
+            pending.add(executor.submit(grade, transcript_id, line))
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield future.result()
+
+
+# The "id" field when present, otherwise the line number (stable as long as the file is only appended to)
+def _transcript_id(line, line_number):
+    try:
+        transcript_id = json.loads(line).get("id")
+    except (ValueError, AttributeError):
+        transcript_id = None
+    return str(transcript_id) if transcript_id is not None else f"line-{line_number}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Transcripts JSONL file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="Results JSONL file, also used as the checkpoint (default: stdout, no checkpoint)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BATCH_WORKERS", "4")), help="Transcripts graded in parallel")
+    args = parser.parse_args(argv)
+
+    import app # Imported late: it reads the AI configuration from the environment / .env
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    checkpoint = Checkpoint(args.output) if args.output != "-" else None
+    if checkpoint is not None and len(checkpoint):
+        print(f"Resuming: {len(checkpoint)} transcripts already in {args.output}", file=sys.stderr)
+
+    counts = {"ok": 0, "error": 0, "retry": 0}
+    try:
+        for result in grade_batch(source, app.generate_ai_response, app.fit_history_to_budget,
+                                  app.MAX_QUESTIONS, args.workers, checkpoint, replay=False):
+            if result.get("retryable"):
+                counts["retry"] += 1
+                print(f"{result['id']}: {result['error']} (will retry on the next run)", file=sys.stderr)
+            else:
+                counts[result["status"]] += 1
+            if checkpoint is None:
+                print(json.dumps(result, ensure_ascii=False), flush=True)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        if source is not sys.stdin:
+            source.close()
+
+    print(f"Graded {counts['ok']}, failed {counts['error']}, to retry {counts['retry']}", file=sys.stderr)
+    return 1 if counts["retry"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
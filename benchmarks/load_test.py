@@ -0,0 +1,186 @@
+"""End-to-end load benchmark for the interview and research endpoints.
+
+Drives /interview/start, /interview/answer and /research at a configurable
+concurrency and reports throughput plus p50/p95/p99 latency per endpoint.
+
+By default the app runs in-process (Flask test client) with the local fake AI
+provider, so no API key or network is needed:
+
+    python benchmarks/load_test.py --concurrency 20 --interviews 50 --research 100
+
+Use --url to benchmark a running server instead (whatever provider it uses;
+start it with RATE_LIMIT_PER_MINUTE=0, since every virtual user has the same address):
+
+    python benchmarks/load_test.py --url http://127.0.0.1:5000
+
+Fake provider behaviour is configured with the same environment variables as
+the app: FAKE_LLM_LATENCY_MS, FAKE_LLM_LATENCY_SIGMA, FAKE_LLM_ERROR_RATE, FAKE_LLM_SEED.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- Clients ---
+class InProcessClient:
+    def __init__(self):
+        os.environ.setdefault("LLM_PROVIDER", "fake")
+        # All virtual users share one address: measure the app, not the per-client rate limit
+        os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+        sys.path.insert(0, REPO_ROOT)
+        import app  # Imported late so LLM_PROVIDER is set first
+        self._app = app.app
+
+    def post(self, path, payload):
+        # A test client per call: they are cheap and not meant to be shared across threads
+        response = self._app.test_client().post(path, json=payload)
+        return response.status_code, response.get_json(silent=True) or {}
+
+
+class HttpClient:
+    def __init__(self, base_url, timeout=120):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def post(self, path, payload):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            try:
+                return e.code, json.loads(body or b"{}")
+            except ValueError:
+                return e.code, {}
+
+
+# --- Measurement ---
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)  # endpoint -> [latency_seconds]
+        self.errors = defaultdict(int)  # endpoint -> count
+
+    def timed_post(self, client, path, payload):
+        start = time.perf_counter()
+        try:
+            status, data = client.post(path, payload)
+        except Exception as e:
+            status, data = 0, {"error": str(e)}
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.samples[path].append(elapsed)
+            if status != 200:
+                self.errors[path] += 1
+        return status, data
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+# --- Scenarios ---
+def run_interview(client, recorder, topic, answers):
+    status, data = recorder.timed_post(client, "/interview/start", {"topic": topic})
+    if status != 200:
+        return
+    session_id = data.get("session_id")
+    for i in range(answers):
+        status, data = recorder.timed_post(client, "/interview/answer", {
+            "session_id": session_id,
+            "answer": f"Câu trả lời thử nghiệm số {i + 1} về {topic}.",
+        })
+        if status != 200 or data.get("status") == "finished":
+            return
+
+
+def run_research(client, recorder, topic):
+    recorder.timed_post(client, "/research", {"topic": topic})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process app with the fake provider)")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument("--interviews", type=int, default=20, help="Interviews to run")
+    parser.add_argument("--answers", type=int, default=3, help="Answers submitted per interview")
+    parser.add_argument("--research", type=int, default=20, help="Research requests to send")
+    parser.add_argument("--research-topics", type=int, default=5, help="Distinct research topics (repeats hit the cache)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the workload order")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--max-p95-ms", type=float, help="Exit with status 1 if any endpoint's p95 exceeds this")
+    args = parser.parse_args(argv)
+
+    client = HttpClient(args.url) if args.url else InProcessClient()
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+
+    interview_topics = ["Python Backend Development", "Lập trình Web Frontend", "Mạng Máy tính Cơ bản", "Docker"]
+    tasks = [lambda t=rng.choice(interview_topics): run_interview(client, recorder, t, args.answers)
+             for _ in range(args.interviews)]
+    tasks += [lambda t=f"Chủ đề nghiên cứu {rng.randrange(args.research_topics)}": run_research(client, recorder, t)
+              for _ in range(args.research)]
+    rng.shuffle(tasks)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for future in [executor.submit(task) for task in tasks]:
+            future.result()
+    wall_time = time.perf_counter() - start
+
+    report = {"wall_time_s": round(wall_time, 3), "concurrency": args.concurrency, "endpoints": {}}
+    total_requests = 0
+    for path, samples in sorted(recorder.samples.items()):
+        samples.sort()
+        total_requests += len(samples)
+        report["endpoints"][path] = {
+            "requests": len(samples),
+            "errors": recorder.errors[path],
+            "p50_ms": round(percentile(samples, 50) * 1000, 1),
+            "p95_ms": round(percentile(samples, 95) * 1000, 1),
+            "p99_ms": round(percentile(samples, 99) * 1000, 1),
+        }
+    report["requests"] = total_requests
+    report["throughput_rps"] = round(total_requests / wall_time, 2) if wall_time > 0 else 0.0
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print(f"{'endpoint':<22}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for path, stats in report["endpoints"].items():
+            print(f"{path:<22}{stats['requests']:>9}{stats['errors']:>8}"
+                  f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+        print(f"\n{total_requests} requests in {wall_time:.2f}s -> {report['throughput_rps']} req/s "
+              f"at concurrency {args.concurrency}")
+
+    if args.max_p95_ms is not None:
+        slow = [path for path, stats in report["endpoints"].items() if stats["p95_ms"] > args.max_p95_ms]
+        if slow:
+            print(f"p95 above {args.max_p95_ms} ms: {', '.join(slow)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Correctness check, micro-benchmark and fuzz run for the AI output parser.
+
+Every case in parser_corpus.jsonl is parsed and compared with its expected
+sections, then the whole corpus is parsed repeatedly to measure throughput:
+
+    python benchmarks/parser_bench.py --iterations 2000
+
+--fuzz N additionally parses N seeded random mutations of the corpus (dropped,
+duplicated and mangled markers, truncation, random bytes) and fails if the
+parser ever raises:
+
+    python benchmarks/parser_bench.py --fuzz 20000 --seed 1
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from response_parser import FEEDBACK_SECTIONS, FINAL_SECTIONS, missing_sections, parse_sections  # noqa: E402
+
+SECTIONS = {"feedback": FEEDBACK_SECTIONS, "final_evaluation": FINAL_SECTIONS}
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parser_corpus.jsonl")
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def parse_case(case, text=None):
+    return parse_sections(case["text"] if text is None else text, SECTIONS[case["parser"]],
+                          case.get("json_output", False))
+
+
+# --- Correctness ---
+def check(corpus):
+    failures = 0
+    for case in corpus:
+        found = parse_case(case)
+        errors = [f"{section}: {found.get(section)!r} != {value!r}"
+                  for section, value in case.get("expect", {}).items() if found.get(section) != value]
+        if "missing" in case and missing_sections(found, SECTIONS[case["parser"]]) != case["missing"]:
+            errors.append(f"missing {missing_sections(found, SECTIONS[case['parser']])} != {case['missing']}")
+        if errors:
+            failures += 1
+            print(f"FAIL {case['name']}: " + "; ".join(errors))
+    print(f"{len(corpus) - failures}/{len(corpus)} corpus cases OK")
+    return failures
+
+
+# --- Throughput ---
+def bench(corpus, iterations):
+    total_bytes = sum(len(case["text"].encode("utf-8")) for case in corpus)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for case in corpus:
+            parse_case(case)
+    elapsed = time.perf_counter() - start
+    parses = iterations * len(corpus)
+    print(f"{parses} parses in {elapsed:.2f}s: {parses / elapsed:,.0f} parses/s, "
+          f"{iterations * total_bytes / elapsed / 1e6:.1f} MB/s, {elapsed / parses * 1e6:.1f} µs/parse")
+
+
+# --- Fuzzing ---
+MARKER_NOISE = ["---", "--- ", "---FEEDBACK", "--- next_question ---", "**---SCORE_HINT---**", "---SUMMARY---",
+                "---FINAL_SCORE", "---UNKNOWN---", "```", "{", "}", '"feedback": ', "\n", "\x00", "\ud800"]
+
+
+def mutate(text, rng):
+    for _ in range(rng.randint(1, 4)):
+        op = rng.randrange(5)
+        pos = rng.randint(0, len(text))
+        if op == 0:  # Truncate
+            text = text[:pos]
+        elif op == 1:  # Insert marker-like noise
+            text = text[:pos] + rng.choice(MARKER_NOISE) + text[pos:]
+        elif op == 2:  # Delete a span (often part of a marker)
+            text = text[:pos] + text[pos + rng.randint(1, 20):]
+        elif op == 3:  # Duplicate a span
+            end = min(len(text), pos + rng.randint(1, 200))
+            text = text[:end] + text[pos:end] + text[end:]
+        else:  # Random characters
+            text = text[:pos] + "".join(chr(rng.randrange(1, 0x2FFF)) for _ in range(rng.randint(1, 10))) + text[pos:]
+    return text
+
+
+def fuzz(corpus, runs, seed):
+    rng = random.Random(seed)
+    for run in range(runs):
+        case = rng.choice(corpus)
+        text = mutate(case["text"], rng)
+        try:
+            found = parse_case(case, text)
+        except Exception as e:
+            print(f"FUZZ FAIL (run {run}, case {case['name']}): {type(e).__name__}: {e}\n{text!r}")
+            return 1
+        if not all(isinstance(value, str) and value for value in found.values()):
+            print(f"FUZZ FAIL (run {run}, case {case['name']}): empty or non-string section {found!r}")
+            return 1
+    print(f"{runs} fuzzed inputs parsed without errors (seed {seed})")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--iterations", type=int, default=1000, help="Passes over the corpus for the benchmark")
+    parser.add_argument("--fuzz", type=int, default=0, help="Number of mutated inputs to parse")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    failures = check(corpus)
+    bench(corpus, args.iterations)
+    if args.fuzz:
+        failures += fuzz(corpus, args.fuzz, args.seed)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+from metrics import PARSE_FALLBACKS, PARSE_REPAIRS, log
+from prompt_budget import clip_text
+from response_parser import FEEDBACK_SECTIONS, FINAL_SECTIONS, json_schema, missing_sections, parse_sections
+
+
+# --- Interview prompts and their parsers ---
+# Shared by the live endpoints in app.py and the offline batch grader, so a prompt
+# change applies to both. The model answers in '---'-delimited sections, or with
+# json_output=True in a JSON object with the same sections as lowercase keys.
+# The full answer is already the last history entry; the prompt only quotes its beginning
+ANSWER_QUOTE_CHARS = 600
+REPAIR_QUOTE_CHARS = 4000 # The malformed output quoted back in a repair prompt
+
+SECTION_HINTS = {
+    "FEEDBACK": "Phản hồi đánh giá câu trả lời ở đây",
+    "NEXT_QUESTION": 'Câu hỏi tiếp theo ở đây, hoặc thông báo "END_INTERVIEW" nếu đã đủ 10 câu',
+    "SCORE_HINT": 'Gợi ý ngắn gọn (1-2 từ) về mức độ đánh giá cho câu trả lời này (ví dụ: "Good", "OK", "Needs Improvement"). Dùng tiếng Anh để dễ xử lý hơn. Đừng giải thích.',
+    "SUMMARY": "Đánh giá tổng quan ở đây",
+    "FINAL_SCORE": "Điểm số cuối cùng (chỉ con số hoặc chuỗi điểm - VD: 75/100, B+, Pass)",
+}
+FEEDBACK_ONLY_SECTIONS = ("FEEDBACK", "SCORE_HINT")
+
+
+def format_instructions(sections, json_output=False):
+    if json_output:
+        keys = ", ".join(f'"{section.lower()}" ({SECTION_HINTS[section]})' for section in sections)
+        return f"Chỉ trả về một đối tượng JSON với các khóa: {keys}"
+    return "\n".join(f"---{section}---\n[{SECTION_HINTS[section]}]" for section in sections)
+
+
+def feedback_sections(expect_next_question=True):
+    return FEEDBACK_SECTIONS if expect_next_question else FEEDBACK_ONLY_SECTIONS
+
+
+# Gemini response_schema for the JSON output mode
+def feedback_schema(expect_next_question=True):
+    return json_schema(feedback_sections(expect_next_question))
+
+
+def final_evaluation_schema():
+    return json_schema(FINAL_SECTIONS)
+
+
+def build_first_question_prompt(topic):
+    return f"""Bạn là một chuyên gia phỏng vấn lập trình viên. Hãy tạo câu hỏi phỏng vấn đầu tiên về chủ đề "{topic}". Câu hỏi cần rõ ràng, súc tích và phù hợp với cấp độ trung bình. Sử dụng **định dạng đậm** cho các thuật ngữ quan trọng nếu cần. Chỉ trả về câu hỏi, không có lời giới thiệu hay kết thúc."""
+
+
+# current_index is the 0-based index of the question being answered.
+# With next_question (served from the question bank) the model only writes feedback.
+def build_feedback_prompt(topic, current_question, user_answer, current_index, total_questions, next_question=None,
+                          json_output=False):
+    answer_quote = clip_text(user_answer, ANSWER_QUOTE_CHARS)
+    if next_question is not None:
+        step_2 = f'2. Không tạo câu hỏi tiếp theo: câu hỏi thứ {current_index + 2} đã được chọn sẵn ("{next_question}").'
+    else:
+        step_2 = f'2. Chuẩn bị câu hỏi tiếp theo: Nếu đây là câu hỏi thứ {current_index + 1} (trong tổng số {total_questions} câu), hãy tạo câu hỏi thứ {current_index + 2} (nếu chưa đủ {total_questions} câu) về chủ đề "{topic}", dựa trên câu trả lời vừa rồi hoặc một khía cạnh khác của chủ đề. Sử dụng **định dạng đậm** cho các thuật ngữ quan trọng.'
+    return f"""
+Bạn là chuyên gia phỏng vấn. Dựa trên lịch sử phỏng vấn và câu trả lời gần nhất của ứng viên ("{answer_quote}") cho câu hỏi ("{current_question}"), hãy:
+1. Đánh giá câu trả lời: Cung cấp phản hồi ngắn gọn (khoảng 2-3 dòng) về điểm mạnh, điểm cần cải thiện hoặc mức độ phù hợp. Sử dụng **định dạng đậm** cho các thuật ngữ quan trọng.
+{step_2}
+3. Định dạng phản hồi của bạn theo cấu trúc sau (sử dụng dấu phân cách rõ ràng):
+{format_instructions(feedback_sections(next_question is None), json_output)}
+"""
+
+
+def build_final_score_prompt(topic, json_output=False):
+    return f"""
+Bạn là chuyên gia đánh giá kết quả phỏng vấn. Dựa trên chủ đề "{topic}" và toàn bộ lịch sử phỏng vấn (có sẵn trong bộ nhớ của bạn từ cuộc trò chuyện này), hãy cung cấp:
+1. Một đánh giá tổng quan ngắn gọn (khoảng 3-5 dòng) về hiệu suất của ứng viên trong suốt cuộc phỏng vấn. Sử dụng **định dạng đậm** cho các điểm nổi bật.
+2. Một điểm số cuối cùng. Thang điểm tùy ý bạn (ví dụ: X/100, A-F, Pass/Fail), nhưng phải có con số hoặc ký hiệu rõ ràng thể hiện mức độ.
+3. Định dạng kết quả theo cấu trúc:
+{format_instructions(FINAL_SECTIONS, json_output)}
+"""
+
+
+# A cheap follow-up when required sections are missing: no history, only the malformed
+# output and the format, asking the model to restate it (filling in what is missing)
+def build_repair_prompt(malformed_text, sections, missing, json_output=False):
+    return f"""
+Phản hồi dưới đây của bạn không đúng định dạng yêu cầu (thiếu phần: {", ".join(missing)}). Hãy viết lại theo đúng định dạng, giữ nguyên nội dung đã có và bổ sung phần còn thiếu dựa trên nội dung đó. Chỉ trả về kết quả đã định dạng.
+Định dạng:
+{format_instructions(sections, json_output)}
+Phản hồi gốc:
+<<<
+{clip_text(malformed_text, REPAIR_QUOTE_CHARS)}
+>>>
+"""
+
+
+# Simple scoring based on hint (adjust points as needed)
+def score_points(score_hint, user_answer):
+    lower_score_hint = score_hint.lower()
+    if "good" in lower_score_hint or "excellent" in lower_score_hint or "strong" in lower_score_hint:
+        return 10
+    elif "ok" in lower_score_hint or "average" in lower_score_hint or "decent" in lower_score_hint:
+        return 7
+    elif "improvement" in lower_score_hint or "weak" in lower_score_hint or "needs work" in lower_score_hint:
+        return 3
+    elif "partial" in lower_score_hint:
+        return 5
+     # Award some points even for empty answers if feedback is neutral/OK (optional logic)
+    elif user_answer.strip() == "" and ("neutral" in lower_score_hint or "ok" in lower_score_hint):
+         return 1 # Small penalty for no answer
+    # Add more scoring logic if needed for other hints
+    # Handle 'Error' hint: no points added, potentially subtract?
+    return 0
+
+
+# --- Parsers ---
+# repair(prompt, schema) -> text (e.g. an AI call without history) is tried once when
+# required sections are missing, instead of ending the interview on formatting drift.
+# Sections still missing after that get defaults and count in parse_fallbacks_total.
+def _parse_with_repair(text, sections, parser, json_output, repair):
+    found = parse_sections(text, sections, json_output)
+    missing = missing_sections(found, sections)
+    if missing and repair is not None:
+        log(f"AI output is missing {missing}, asking the model to repair it.")
+        try:
+            repaired_text = repair(build_repair_prompt(text, sections, missing, json_output),
+                                   json_schema(sections) if json_output else None)
+            repaired = parse_sections(repaired_text, sections, json_output)
+            repaired.update(found) # Sections that parsed the first time are kept as they were
+            found = repaired
+        except Exception as e:
+            log(f"Repair prompt failed: {e}")
+        PARSE_REPAIRS.inc(parser=parser, outcome="ok" if not missing_sections(found, sections) else "failed")
+    for section in missing_sections(found, sections):
+        PARSE_FALLBACKS.inc(parser=parser, section=section) # Default value used
+    return found
+
+
+# expect_next_question=False for feedback-only prompts (no NEXT_QUESTION section is asked for)
+def parse_feedback_response(ai_response_text, expect_next_question=True, json_output=False, repair=None):
+    sections = feedback_sections(expect_next_question)
+    found = _parse_with_repair(ai_response_text, sections, "feedback", json_output, repair)
+    if "FEEDBACK" in found:
+        parsed_feedback = found["FEEDBACK"]
+    elif not found and ai_response_text.strip():
+        parsed_feedback = ai_response_text.strip() # No structure at all: the whole text is the feedback
+    else:
+        parsed_feedback = "Không có phản hồi từ AI."
+    # Only if even the repair produced no question does the interview end early
+    parsed_next_question = found.get("NEXT_QUESTION", "END_INTERVIEW")
+    parsed_score_hint = found.get("SCORE_HINT", "Neutral")
+    return parsed_feedback, parsed_next_question, parsed_score_hint
+
+
+# fallback_score is used when the AI output has no FINAL_SCORE section
+def parse_final_evaluation(final_evaluation_text, fallback_score, json_output=False, repair=None):
+    found = _parse_with_repair(final_evaluation_text, FINAL_SECTIONS, "final_evaluation", json_output, repair)
+    parsed_summary = found.get("SUMMARY", "Không có tóm tắt từ AI.")
+    parsed_final_score = found.get("FINAL_SCORE", fallback_score)
+    return parsed_summary, parsed_final_score
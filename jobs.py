@@ -0,0 +1,230 @@
+import json
+import math
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import Overloaded
+from metrics import log
+
+
+# --- Background jobs ---
+# Slow AI work that the user does not need in the same response (the final interview
+# evaluation, long research reports) runs on a small pool; the request returns a
+# job_id right away and the client polls GET /jobs/<job_id> (long-polling with ?wait=).
+# Job records: {"job_id", "kind", "status": "pending"|"running"|"done"|"error",
+#               "pid", "created_at", "started_at" (running),
+#               "result": ... (done), "error": ..., "retryable": ... (error)}
+# Finished jobs are kept for `ttl` seconds. With db_path, records are also written to
+# SQLite so that any worker process can answer the poll, not only the one running it.
+# At most max_queue jobs wait for a worker; beyond that submit() raises Overloaded.
+# A job still running after max_runtime seconds, or whose worker process has died,
+# is reported as a retryable error instead of staying "running" forever.
+ACTIVE = ("pending", "running")
+
+
+class JobManager:
+    def __init__(self, max_workers=4, ttl=3600, max_jobs=1000, db_path=None, max_queue=32, max_runtime=300):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.max_queue = max_queue
+        self.max_runtime = max_runtime
+        self.db_path = db_path
+        self._max_workers = max_workers
+        self._executor = None
+        self._jobs = OrderedDict() # job_id -> record, oldest first
+        self._pending = 0 # Submitted jobs not started yet
+        self._avg_duration = 5.0 # Moving average of job run time, for Retry-After
+        self._cond = threading.Condition()
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = self._connect()
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    " job_id TEXT PRIMARY KEY,"
+                    " record TEXT NOT NULL,"
+                    " updated_at REAL NOT NULL)"
+                )
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def submit(self, kind, fn):
+        """Run fn() in the background; its return value (JSON-serializable) becomes the result.
+
+        Raises Overloaded if max_queue jobs are already waiting.
+        """
+        job_id = secrets.token_urlsafe(12)
+        record = {"job_id": job_id, "kind": kind, "status": "pending", "pid": os.getpid(), "created_at": time.time()}
+        with self._cond:
+            if self._pending >= self.max_queue:
+                retry_after = max(1, math.ceil(self._avg_duration * (self._pending + 1) / self._max_workers))
+                raise Overloaded("Có quá nhiều tác vụ nền đang chờ. Vui lòng thử lại sau.", retry_after,
+                                 reason="jobs_full")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="jobs")
+            self._pending += 1
+            self._jobs[job_id] = record
+            self._evict_locked(time.time())
+        self._db_save(record)
+        self._executor.submit(self._run, job_id, fn)
+        return job_id
+
+    def get(self, job_id, wait=0):
+        """Return a copy of the job record, or None if unknown/expired.
+
+        With wait > 0, block up to that many seconds for the job to finish.
+        """
+        deadline = time.monotonic() + wait
+        with self._cond:
+            record = self._jobs.get(job_id)
+            while record is not None and record["status"] in ACTIVE and not self._lost(record):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if record["status"] == "running": # Wake up when it passes max_runtime
+                    remaining = min(remaining, record["started_at"] + self.max_runtime - time.time())
+                self._cond.wait(max(0.0, remaining))
+                record = self._jobs.get(job_id)
+            if record is not None:
+                record = dict(record)
+        if record is not None:
+            reason = self._lost(record)
+            if reason:
+                self._update(job_id, status="error", error=reason, retryable=True)
+                return self.get(job_id)
+            return record
+
+        # Not in this process: another worker may be running it. Its updates only
+        # reach us through SQLite, so poll with a growing delay until wait runs out.
+        record = self._db_load(job_id)
+        delay = 0.1
+        while record is not None and record["status"] in ACTIVE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(delay, remaining))
+            delay = min(0.5, delay * 2)
+            record = self._db_load(job_id)
+        return record
+
+    def stats(self):
+        with self._cond:
+            stats = {"jobs": len(self._jobs), "queued": self._pending}
+            for record in self._jobs.values():
+                stats[record["status"]] = stats.get(record["status"], 0) + 1
+        return stats
+
+    # --- Internals ---
+    def _run(self, job_id, fn):
+        with self._cond:
+            self._pending -= 1
+        started = time.monotonic()
+        self._update(job_id, status="running", started_at=time.time())
+        try:
+            result = fn()
+        except Exception as e:
+            log(f"Background job {job_id} failed: {e}")
+            self._update(job_id, status="error", error=str(e), retryable=getattr(e, "retryable", False))
+        else:
+            self._update(job_id, status="done", result=result)
+        with self._cond:
+            self._avg_duration = 0.9 * self._avg_duration + 0.1 * (time.monotonic() - started)
+
+    def _update(self, job_id, **fields):
+        with self._cond:
+            record = self._jobs.get(job_id)
+            # A job already failed as overdue keeps that result when its thread finally returns
+            if record is None or record["status"] not in ACTIVE:
+                return
+            record.update(fields)
+            if record["status"] in ("done", "error"):
+                record["finished_at"] = time.time()
+            snapshot = dict(record)
+            self._cond.notify_all()
+        self._db_save(snapshot)
+
+    def _lost(self, record):
+        """Return why an unfinished job will never finish, or None."""
+        if record["status"] not in ACTIVE:
+            return None
+        if record["status"] == "running" and time.time() - record.get("started_at", time.time()) > self.max_runtime:
+            return "Tác vụ nền chạy quá thời gian cho phép. Vui lòng thử lại."
+        if not _process_alive(record.get("pid")):
+            return "Tác vụ nền bị gián đoạn do tiến trình xử lý đã dừng. Vui lòng thử lại."
+        return None
+
+    def _evict_locked(self, now):
+        # Drop expired finished jobs, then the oldest finished ones beyond max_jobs
+        for job_id, record in list(self._jobs.items()):
+            finished_at = record.get("finished_at")
+            if finished_at is not None and now - finished_at > self.ttl:
+                del self._jobs[job_id]
+        for job_id, record in list(self._jobs.items()):
+            if len(self._jobs) <= self.max_jobs:
+                break
+            if "finished_at" in record:
+                del self._jobs[job_id]
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def _db_save(self, record):
+        if self._db is None:
+            return
+        now = time.time()
+        with self._db_lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, record, updated_at) VALUES (?, ?, ?)",
+                (record["job_id"], json.dumps(record, ensure_ascii=False), now),
+            )
+            self._db.execute("DELETE FROM jobs WHERE updated_at < ?", (now - self.ttl,))
+
+    def _db_load(self, job_id):
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute("SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        record = json.loads(row[0])
+        reason = self._lost(record)
+        if reason:
+            # Record the failure for every poller; only if the owner has not written a result meanwhile
+            record.update(status="error", error=reason, retryable=True, finished_at=time.time())
+            with self._db_lock, self._db:
+                updated = self._db.execute(
+                    "UPDATE jobs SET record = ?, updated_at = ? WHERE job_id = ? AND record = ?",
+                    (json.dumps(record, ensure_ascii=False), time.time(), job_id, row[0]),
+                ).rowcount
+            if not updated:
+                return self._db_load(job_id)
+        return record
+
+    def _reset_after_fork(self):
+        # Jobs belong to the process that runs them; a worker starts with none
+        self._cond = threading.Condition()
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._db_lock = threading.Lock()
+        if self.db_path:
+            self._db = self._connect()
+
+
+def _process_alive(pid):
+    # Job records live in a local SQLite file, so their pids are on this host
+    if pid is None or pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,245 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from metrics import (AI_BLOCKED_RESPONSES, AI_PROMPT_TOKENS, AI_REQUEST_DURATION, AI_RESPONSE_TOKENS,
+                     AI_RETRIES, AI_UPSTREAM_DURATION, log, log_event)
+from prompt_budget import estimate_tokens, prompt_tokens
+
+
+# --- Typed errors for AI calls ---
+# str(error) is the Vietnamese message shown to the user.
+# retryable=True means the same request may succeed if sent again (timeouts, quota, 5xx).
+class AIError(Exception):
+    retryable = False
+
+
+class AIUnavailableError(AIError):
+    pass
+
+
+class AIBlockedError(AIError):
+    pass
+
+
+class AIEmptyResponseError(AIError):
+    pass
+
+
+class AITimeoutError(AIError):
+    retryable = True
+
+
+class AIUpstreamError(AIError):
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+# HTTP status codes (as exposed by google.api_core exceptions) worth retrying
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+# Short label for metrics/logs
+def error_outcome(error):
+    return {
+        AIUnavailableError: "unavailable",
+        AIBlockedError: "blocked",
+        AIEmptyResponseError: "empty",
+        AITimeoutError: "timeout",
+    }.get(type(error), "upstream_error")
+
+
+def is_retryable_exception(exc):
+    code = getattr(exc, "code", None)
+    # google.api_core exceptions carry the HTTP status as an int-like `code`
+    try:
+        if code is not None and int(code) in RETRYABLE_STATUS_CODES:
+            return True
+    except (TypeError, ValueError):
+        pass
+    return isinstance(exc, (TimeoutError, ConnectionError))
+
+
+# --- Client ---
+# All upstream calls share one bounded set of slots, so a burst of requests
+# queues here instead of opening unlimited connections to Gemini.
+# Every call has a deadline covering queueing, retries and backoff.
+class LLMClient:
+    def __init__(self, provider_factory, max_concurrency=8, timeout=30.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0):
+        # provider_factory() -> llm_providers.LLMProvider, or None if it failed to load.
+        # Called on every attempt so the provider can be created lazily per worker process.
+        self.provider_factory = provider_factory
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._pid = None
+        self._pool_lock = threading.Lock()
+        self._slots = None
+        self._executor = None
+
+    def _ensure_pool(self):
+        # Threads do not survive fork(): build the pool lazily, and again in each child process
+        if self._pid != os.getpid():
+            with self._pool_lock:
+                if self._pid != os.getpid():
+                    self._slots = threading.BoundedSemaphore(self.max_concurrency)
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm")
+                    self._pid = os.getpid()
+
+    def generate(self, prompt, history=None, timeout=None, kind=None, response_schema=None):
+        """Send one prompt and return the response text, or raise AIError.
+
+        With response_schema the provider is asked for JSON output matching it.
+        """
+        kind = kind or "other"
+        start = time.perf_counter()
+        outcome = "ok"
+        deadline = time.monotonic() + (timeout or self.timeout)
+        self._ensure_pool()
+        future = self._executor.submit(self._generate_with_retries, prompt, history, deadline, kind,
+                                       response_schema)
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            log("AI call exceeded its deadline.")
+            outcome = "timeout"
+            raise AITimeoutError("AI phản hồi quá lâu. Vui lòng thử lại.")
+        except AIError as e:
+            outcome = error_outcome(e)
+            raise
+        finally:
+            self._record_call(kind, outcome, time.perf_counter() - start)
+
+    def stream(self, prompt, history=None, timeout=None, kind=None, response_schema=None):
+        """Yield the response text chunk by chunk, or raise AIError.
+
+        Retries only happen before the first chunk; once text has been sent to
+        the caller a failure is raised as-is.
+        """
+        kind = kind or "other"
+        start = time.perf_counter()
+        outcome = "ok"
+        deadline = time.monotonic() + (timeout or self.timeout)
+        self._ensure_pool()
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self._record_call(kind, "timeout", time.perf_counter() - start)
+            raise AITimeoutError("AI phản hồi quá lâu. Vui lòng thử lại.")
+        try:
+            response = self._with_retries(
+                lambda remaining: self._send(prompt, history, remaining, kind, stream=True,
+                                             response_schema=response_schema), deadline, kind)
+            produced_text = ""
+            try:
+                for chunk in response:
+                    # Blocked chunks have no text parts; chunk.text raises in that case
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        text = ""
+                    if text:
+                        produced_text += text
+                        yield text
+            except AIError:
+                raise
+            except Exception as e:
+                log(f"AI API Error (stream): {e}")
+                raise AIUpstreamError(f"Đã xảy ra lỗi khi giao tiếp với AI: {e}",
+                                      retryable=is_retryable_exception(e) and not produced_text)
+            if not produced_text:
+                raise self._empty_response_error(response, kind)
+            AI_RESPONSE_TOKENS.observe(estimate_tokens(produced_text), kind=kind)
+        except AIError as e:
+            outcome = error_outcome(e)
+            raise
+        except GeneratorExit:
+            outcome = "cancelled" # The client went away mid-stream
+            raise
+        finally:
+            self._slots.release()
+            self._record_call(kind, outcome, time.perf_counter() - start)
+
+    # --- Internals ---
+    def _generate_with_retries(self, prompt, history, deadline, kind, response_schema=None):
+        with self._slots:
+            response = self._with_retries(
+                lambda remaining: self._send(prompt, history, remaining, kind, response_schema=response_schema),
+                deadline, kind)
+            text = self._extract_text(response, kind)
+            usage = getattr(response, "usage_metadata", None)
+            response_tokens = getattr(usage, "candidates_token_count", 0) or estimate_tokens(text)
+            AI_RESPONSE_TOKENS.observe(response_tokens, kind=kind)
+            return text
+
+    def _send(self, prompt, history, remaining, kind, stream=False, response_schema=None):
+        provider = self.provider_factory()
+        if provider is None:
+            log("Attempted AI call but model failed to load.")
+            raise AIUnavailableError("Đã xảy ra lỗi: Mô hình AI không khả dụng.")
+        # Copy the list: the caller keeps appending to its history after this call returns
+        history = list(history) if history is not None else []
+        AI_PROMPT_TOKENS.observe(prompt_tokens(prompt, history), kind=kind)
+        return provider.send(prompt, history, remaining, stream=stream, kind=kind, response_schema=response_schema)
+
+    def _with_retries(self, call, deadline, kind):
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise AITimeoutError("AI phản hồi quá lâu. Vui lòng thử lại.")
+            attempt_start = time.perf_counter()
+            try:
+                response = call(remaining)
+                AI_UPSTREAM_DURATION.observe(time.perf_counter() - attempt_start, kind=kind, outcome="ok")
+                return response
+            except AIError:
+                raise
+            except Exception as e:
+                retryable = is_retryable_exception(e)
+                AI_UPSTREAM_DURATION.observe(time.perf_counter() - attempt_start, kind=kind,
+                                             outcome="retryable_error" if retryable else "error")
+                log(f"AI API Error (attempt {attempt + 1}): {e}")
+                if not retryable or attempt >= self.max_retries:
+                    raise AIUpstreamError(f"Đã xảy ra lỗi khi giao tiếp với AI: {e}", retryable=retryable)
+                # Full-jitter exponential backoff, never sleeping past the deadline
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                if time.monotonic() + delay >= deadline:
+                    raise AITimeoutError("AI phản hồi quá lâu. Vui lòng thử lại.")
+                AI_RETRIES.inc(kind=kind)
+                time.sleep(delay)
+                attempt += 1
+
+    def _record_call(self, kind, outcome, elapsed):
+        AI_REQUEST_DURATION.observe(elapsed, kind=kind, outcome=outcome)
+        log_event("ai_call", kind=kind, outcome=outcome, duration_ms=round(elapsed * 1000, 1))
+
+    def _extract_text(self, response, kind):
+        # Sometimes content is blocked; response.text raises ValueError in that case
+        try:
+            text = response.text
+        except ValueError:
+            text = ""
+        if text and text.strip():
+            return text.strip()
+        raise self._empty_response_error(response, kind)
+
+    def _empty_response_error(self, response, kind):
+        log(f"AI response blocked or empty: {response}")
+        prompt_feedback = getattr(response, "prompt_feedback", None)
+        if prompt_feedback and prompt_feedback.block_reason:
+            log(f"Block reason: {prompt_feedback.block_reason}")
+            AI_BLOCKED_RESPONSES.inc(kind=kind, reason="blocked")
+            return AIBlockedError("Xin lỗi, yêu cầu của bạn bị chặn do nội dung không phù hợp.")
+        candidates = getattr(response, "candidates", None)
+        if candidates and candidates[0].finish_reason:
+            log(f"Finish reason: {candidates[0].finish_reason}")
+            AI_BLOCKED_RESPONSES.inc(kind=kind, reason="incomplete")
+            return AIEmptyResponseError("Xin lỗi, tôi không thể tạo phản hồi hoàn chỉnh.")
+        AI_BLOCKED_RESPONSES.inc(kind=kind, reason="empty")
+        return AIEmptyResponseError("Xin lỗi, tôi không thể tạo phản hồi cho yêu cầu này.")
@@ -0,0 +1,144 @@
+import itertools
+import json
+import math
+import random
+import threading
+import time
+
+from response_parser import KNOWN_SECTIONS, parse_delimited
+
+
+# --- Provider interface ---
+# LLMClient talks to a provider instead of google.generativeai directly.
+# send() returns a Gemini-like response: `.text`, `.prompt_feedback`, `.candidates`,
+# and, when stream=True, an iterable of chunks that each have `.text`.
+# `kind` names the prompt type ("first_question", "feedback", "final_score",
+# "research", "summary", "repair") for providers that care, such as the fake below.
+# response_schema (a JSON schema dict) asks for JSON output constrained to it.
+class LLMProvider:
+    name = "base"
+
+    def send(self, prompt, history, timeout, stream=False, kind=None, response_schema=None):
+        raise NotImplementedError
+
+    def check(self, timeout):
+        """Raise if the backend is not reachable (used by /readyz)."""
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, model):
+        self.model = model
+
+    def send(self, prompt, history, timeout, stream=False, kind=None, response_schema=None):
+        chat = self.model.start_chat(history=history)
+        kwargs = {}
+        if response_schema is not None:
+            kwargs["generation_config"] = {"response_mime_type": "application/json",
+                                           "response_schema": response_schema}
+        # request_options timeout bounds the HTTP call itself so the worker is freed
+        return chat.send_message(prompt, stream=stream, request_options={"timeout": timeout}, **kwargs)
+
+    def check(self, timeout):
+        # Model metadata lookup: proves the key and model are valid without generating tokens
+        import google.generativeai as genai
+        genai.get_model(self.model.model_name, request_options={"timeout": timeout})
+
+
+# --- Deterministic local fake ---
+# For load tests and benchmarks without network access or an API key.
+# Responses follow the same ---FEEDBACK---/---NEXT_QUESTION---/---SCORE_HINT---
+# and ---SUMMARY---/---FINAL_SCORE--- formats the real prompts ask for.
+# Latency is log-normal around latency_ms; error_rate injects retryable 503s and
+# malformed_rate drops one section marker (to exercise the repair re-prompt).
+class FakeUpstreamError(Exception):
+    code = 503  # Looks like google.api_core.exceptions.ServiceUnavailable to is_retryable_exception
+
+
+class _FakeResponse:
+    def __init__(self, text, chunk_size=None):
+        self.text = text
+        self.prompt_feedback = None
+        self.candidates = []
+        self._chunk_size = chunk_size
+
+    def __iter__(self):
+        size = self._chunk_size or len(self.text) or 1
+        for start in range(0, len(self.text), size):
+            yield _FakeResponse(self.text[start:start + size])
+
+
+class FakeProvider(LLMProvider):
+    name = "fake"
+
+    SCORE_HINTS = ["Good", "OK", "Needs Improvement", "Partial", "Excellent"]
+
+    def __init__(self, latency_ms=200.0, latency_sigma=0.5, error_rate=0.0, seed=0,
+                 stream_chunk_chars=40, malformed_rate=0.0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.stream_chunk_chars = stream_chunk_chars
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._counter = itertools.count(1)
+
+    def send(self, prompt, history, timeout, stream=False, kind=None, response_schema=None):
+        with self._random_lock:
+            latency = self.latency_ms / 1000.0
+            if self.latency_sigma > 0:
+                latency *= math.exp(self._random.gauss(0, self.latency_sigma))
+            fail = self._random.random() < self.error_rate
+            malformed = self._random.random() < self.malformed_rate
+            hint = self._random.choice(self.SCORE_HINTS)
+        n = next(self._counter)
+
+        if latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Fake provider exceeded the {timeout:.1f}s timeout")
+        time.sleep(latency)
+        if fail:
+            raise FakeUpstreamError("503 Fake upstream unavailable")
+
+        kind = kind or self._guess_kind(prompt)
+        if kind == "repair": # Restate in the format the repair prompt asks for
+            kind = "final_score" if "SUMMARY" in prompt else "feedback"
+        elif malformed and kind in ("feedback", "final_score"):
+            kind += "_malformed"
+        text = self._script(kind, n, hint)
+        if response_schema is not None:
+            found = parse_delimited(text, KNOWN_SECTIONS)
+            text = json.dumps({key: found.get(key.upper(), "") for key in response_schema["properties"]},
+                              ensure_ascii=False)
+        return _FakeResponse(text, self.stream_chunk_chars if stream else None)
+
+    def _guess_kind(self, prompt):
+        if "---FINAL_SCORE---" in prompt or '"final_score"' in prompt:
+            return "final_score"
+        if "---FEEDBACK---" in prompt or '"feedback"' in prompt:
+            return "feedback"
+        return "first_question"
+
+    def _script(self, kind, n, hint):
+        if kind == "feedback_malformed": # The NEXT_QUESTION marker went missing
+            return (f"---FEEDBACK---\nCâu trả lời chưa đầy đủ (phản hồi giả #{n}).\n"
+                    f"Hãy giải thích **chủ đề con #{n}** và cho một ví dụ?\n"
+                    f"---SCORE_HINT---\n{hint}")
+        if kind == "final_score_malformed":
+            return f"Ứng viên nắm được **kiến thức cơ bản** (đánh giá giả #{n}). Điểm: {60 + n % 40}/100"
+        if kind == "feedback":
+            return (f"---FEEDBACK---\nCâu trả lời có ý đúng về **khái niệm chính** (phản hồi giả #{n}).\n"
+                    f"---NEXT_QUESTION---\nHãy giải thích **chủ đề con #{n}** và cho một ví dụ?\n"
+                    f"---SCORE_HINT---\n{hint}")
+        if kind == "final_score":
+            return (f"---SUMMARY---\nỨng viên nắm được **kiến thức cơ bản** (đánh giá giả #{n}).\n"
+                    f"---FINAL_SCORE---\n{60 + n % 40}/100")
+        if kind == "research":
+            paragraph = f"**Báo cáo giả #{n}.** Nội dung mô phỏng dùng cho kiểm thử tải. "
+            return "\n".join(["## Tổng quan", paragraph * 8, "## Ứng dụng", "- Ý 1\n- Ý 2\n- Ý 3",
+                              "## Xu hướng", paragraph * 6])
+        if kind == "summary":
+            return f"Ứng viên đã trả lời các câu hỏi trước với mức độ trung bình (tóm tắt giả #{n})."
+        return f"Câu hỏi giả #{n}: **Khái niệm cốt lõi** của chủ đề này là gì?"
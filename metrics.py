@@ -0,0 +1,186 @@
+import json
+import os
+import sys
+import threading
+import time
+
+
+# --- Minimal Prometheus-style metrics ---
+# Counters, gauges and histograms with labels, rendered in the Prometheus text
+# exposition format by render(). Everything registers itself in REGISTRY at
+# import time; the app serves it on /metrics.
+def _escape(label_value):
+    return label_value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            return [f"{self.name}{self._format_labels(key)} {value}" for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    # callback() -> number is evaluated at render time (no labels)
+    def __init__(self, name, help_text, callback):
+        super().__init__(name, help_text)
+        self._callback = callback
+
+    def _samples(self):
+        try:
+            return [f"{self.name} {self._callback()}"]
+        except Exception as e:
+            log(f"Error reading gauge {self.name}: {e}")
+            return []
+
+
+# A counter read from callback() at render time, for components that keep their own
+# monotonically increasing stats (e.g. the research cache)
+class CallbackCounter(Gauge):
+    type_name = "counter"
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=()):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', repr(float(bound)))])} {count}")
+                lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{self.name}_sum{self._format_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{self._format_labels(key)} {series[-1]}")
+        return lines
+
+
+REGISTRY = []
+
+
+def render():
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# --- Structured logs ---
+# With LOG_FORMAT=json, log_event() writes one JSON object per line to stdout, and
+# log() messages become {"event": "log", "message": ...} records on the same stream,
+# so every line of output parses. Otherwise log() prints plain text as before.
+JSON_LOGS = os.getenv("LOG_FORMAT", "").lower() == "json"
+
+
+def log_event(event, **fields):
+    if not JSON_LOGS:
+        return
+    record = {"ts": round(time.time(), 3), "event": event}
+    record.update(fields)
+    sys.stdout.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    sys.stdout.flush()
+
+
+def log(message, **fields):
+    if JSON_LOGS:
+        log_event("log", message=message, **fields)
+    else:
+        print(message)
+
+
+# --- Application metrics ---
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to produce the response, per route (headers only for streams).",
+    ("route", "method", "status"), LATENCY_BUCKETS)
+
+AI_REQUEST_DURATION = Histogram(
+    "ai_request_duration_seconds", "End-to-end AI call time including queueing, retries and backoff.",
+    ("kind", "outcome"), LATENCY_BUCKETS)
+AI_UPSTREAM_DURATION = Histogram(
+    "ai_upstream_duration_seconds", "Time of a single upstream attempt (for streams: until the first chunk).",
+    ("kind", "outcome"), LATENCY_BUCKETS)
+AI_RETRIES = Counter("ai_retries_total", "Upstream attempts retried after a transient error.", ("kind",))
+AI_PROMPT_TOKENS = Histogram(
+    "ai_prompt_tokens", "Prompt size in tokens (history included).", ("kind",), TOKEN_BUCKETS)
+AI_RESPONSE_TOKENS = Histogram(
+    "ai_response_tokens", "Response size in tokens.", ("kind",), TOKEN_BUCKETS)
+AI_BLOCKED_RESPONSES = Counter(
+    "ai_blocked_responses_total", "Responses that were blocked or came back empty.", ("kind", "reason"))
+PARSE_FALLBACKS = Counter(
+    "parse_fallbacks_total", "Delimited AI output that needed a default or the fallback parser.",
+    ("parser", "section"))
+PARSE_REPAIRS = Counter(
+    "parse_repairs_total", "Repair re-prompts sent for malformed AI output, by whether they fixed it.",
+    ("parser", "outcome"))
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "AI-backed requests turned away by rate limiting or the admission queue.",
+    ("route_class", "reason"))
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds", "Time spent waiting in the admission queue before running.",
+    ("route_class",), LATENCY_BUCKETS)
+QUESTIONS_SERVED = Counter(
+    "interview_questions_served_total", "Interview questions by position (first/next) and source (bank/pool/live).",
+    ("position", "source"))
+AI_MODEL_DURATION = Histogram(
+    "ai_model_duration_seconds", "Time of one call to a specific model, including hedged duplicates.",
+    ("model", "kind", "outcome"), LATENCY_BUCKETS)
+AI_HEDGES = Counter(
+    "ai_hedged_requests_total", "Backup requests fired because the primary model was slow or failed.",
+    ("kind", "reason"))
+AI_HEDGE_WINS = Counter(
+    "ai_hedge_wins_total", "Which attempt answered first once a request had been hedged.",
+    ("kind", "model", "attempt"))
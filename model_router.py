@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from llm_client import is_retryable_exception
+from llm_providers import LLMProvider
+from metrics import AI_HEDGE_WINS, AI_HEDGES, AI_MODEL_DURATION
+
+
+# --- Per-model latency tracking ---
+# A sliding window of recent successful latencies per (model, kind). The hedge delay
+# is read from it, so it follows the upstream: a model that is slow today gets hedged
+# later (fewer wasted duplicates), a fast one earlier.
+class LatencyTracker:
+    def __init__(self, window=200, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {} # (model, kind) -> deque of seconds
+        self._lock = threading.Lock()
+
+    def observe(self, model, kind, seconds):
+        with self._lock:
+            samples = self._samples.get((model, kind))
+            if samples is None:
+                samples = self._samples[(model, kind)] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def quantile(self, model, kind, q):
+        """Latency quantile in seconds, or None until min_samples have been seen."""
+        with self._lock:
+            samples = sorted(self._samples.get((model, kind), ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def parse_routes(spec):
+    """"feedback=m1,m2;research=m3" -> {"feedback": ["m1", "m2"], "research": ["m3"]}."""
+    routes = {}
+    for item in (spec or "").split(";"):
+        kind, _, models = item.partition("=")
+        models = [model.strip() for model in models.split(",") if model.strip()]
+        if kind.strip() and models:
+            routes[kind.strip()] = models
+    return routes
+
+
+# --- Routing provider ---
+# Wraps one provider per model name. For each prompt kind the route lists a primary
+# model and, optionally, lighter fallbacks:
+#   - the primary is called first
+#   - if it has not answered after the hedge delay (the primary's recent latency at
+#     hedge_quantile, never less than hedge_after), the backup is fired as well:
+#     the next model in the route, or a duplicate of the primary when there is none
+#   - if the primary fails with a retryable error (quota, 5xx, timeout), the backup
+#     model is tried right away; other errors are raised unchanged
+# Whichever attempt succeeds first is returned; the other one is left to finish and
+# its result discarded. With hedging off and a single model, calls go straight through.
+# For streams, "answered" means the response has started (first chunk).
+class RoutedProvider(LLMProvider):
+    def __init__(self, providers, routes, default_models, hedge_after=None, hedge_quantile=0.95,
+                 max_workers=16, tracker=None):
+        self.providers = providers # model name -> LLMProvider
+        self.routes = routes # kind -> [model, ...]
+        self.default_models = default_models
+        self.hedge_after = hedge_after # Seconds; None disables hedging
+        self.hedge_quantile = hedge_quantile
+        self.tracker = tracker or LatencyTracker()
+        self.name = providers[default_models[0]].name
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def models_for(self, kind):
+        return self.routes.get(kind) or self.default_models
+
+    def send(self, prompt, history, timeout, stream=False, kind=None, response_schema=None):
+        models = self.models_for(kind)
+        primary = models[0]
+        backup = models[1] if len(models) > 1 else (primary if self.hedge_after is not None else None)
+        if backup is None:
+            return self._timed_send(primary, prompt, history, timeout, stream, kind, response_schema)
+
+        deadline = time.monotonic() + timeout
+        hedge_at = self._hedge_at(primary, kind, deadline - timeout)
+        attempts = {self._executor.submit(self._timed_send, primary, prompt, history, timeout, stream, kind,
+                                           response_schema): primary}
+        hedged = False
+        last_error = None
+        pending = set(attempts)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait_for = remaining if hedged else min(remaining, max(0.0, hedge_at - time.monotonic()))
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    if not hedged and not is_retryable_exception(e):
+                        raise # A bad request, auth or schema error: another model would fail the same way
+                    last_error = e
+                    continue
+                if hedged:
+                    AI_HEDGE_WINS.inc(kind=kind or "other", model=attempts[future],
+                                      attempt="primary" if future is next(iter(attempts)) else "backup")
+                return response
+
+            if hedged:
+                continue
+            # Fail over as soon as the primary errors (to a different model only: the
+            # client already retries the same model with backoff), or hedge when it is slow
+            primary_failed = last_error is not None
+            if primary_failed and backup == primary:
+                break
+            if primary_failed or time.monotonic() >= hedge_at:
+                hedged = True
+                AI_HEDGES.inc(kind=kind or "other", reason="error" if primary_failed else "slow")
+                remaining = deadline - time.monotonic()
+                future = self._executor.submit(self._timed_send, backup, prompt, history, remaining, stream, kind,
+                                               response_schema)
+                attempts[future] = backup
+                pending.add(future)
+
+        if last_error is not None and not pending:
+            raise last_error
+        raise TimeoutError(f"No model answered within {timeout:.1f}s")
+
+    def check(self, timeout):
+        for model in {models[0] for models in list(self.routes.values()) + [self.default_models]}:
+            self.providers[model].check(timeout)
+
+    # --- Internals ---
+    def _hedge_at(self, model, kind, started):
+        if self.hedge_after is None:
+            return float("inf") # Backup only on failure
+        delay = self.tracker.quantile(model, kind, self.hedge_quantile)
+        return started + max(self.hedge_after, delay or self.hedge_after)
+
+    def _timed_send(self, model, prompt, history, timeout, stream, kind, response_schema=None):
+        start = time.perf_counter()
+        try:
+            response = self.providers[model].send(prompt, history, timeout, stream=stream, kind=kind,
+                                                 response_schema=response_schema)
+        except Exception:
+            AI_MODEL_DURATION.observe(time.perf_counter() - start, model=model, kind=kind or "other", outcome="error")
+            raise
+        elapsed = time.perf_counter() - start
+        AI_MODEL_DURATION.observe(elapsed, model=model, kind=kind or "other", outcome="ok")
+        self.tracker.observe(model, kind, elapsed)
+        return response
@@ -0,0 +1,107 @@
+import math
+
+from metrics import log
+
+
+# --- Token accounting ---
+# A local estimate, no API call: Gemini averages roughly 3-4 characters per token for
+# English and somewhat fewer for Vietnamese, so 3 keeps the estimate on the safe side.
+CHARS_PER_TOKEN = 3
+
+SUMMARY_HEADER = "(Tóm tắt các lượt phỏng vấn trước)"
+SUMMARY_LINE_CHARS = 160  # Each older turn is clipped to this many characters in the heuristic summary
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def history_tokens(history):
+    return sum(estimate_tokens(part) for entry in history for part in entry["parts"])
+
+
+def prompt_tokens(prompt, history):
+    return estimate_tokens(prompt) + history_tokens(history)
+
+
+# --- Rolling compaction ---
+# When prompt + history exceed the budget, every entry except the most recent
+# `keep_recent` is folded into a single summary entry at the start of the history:
+#   user:  "(Tóm tắt các lượt phỏng vấn trước)\n..."   (rolling summary)
+#   model: "Câu hỏi N: ..."                             (recent turns, verbatim)
+#   user:  answer N ...
+# The history list is modified in place, so the session keeps the compacted form
+# and the summary keeps rolling forward on later turns.
+def compact_history(history, prompt, budget, keep_recent=4, summarize=None):
+    """Shrink history so prompt + history fit in budget tokens.
+
+    summarize(previous_summary, older_entries) may produce the summary text
+    (e.g. with the model); when it is None or fails, a heuristic summary made
+    of clipped turns is used. Returns True if the history was changed.
+    """
+    if prompt_tokens(prompt, history) <= budget:
+        return False
+
+    previous_summary = None
+    body = history
+    if history and _is_summary(history[0]):
+        previous_summary = history[0]["parts"][0]
+        body = history[1:]
+
+    # Recent slice starts on a model turn (a question) so question/answer pairs stay together.
+    # It always keeps at least the newest entry (keep_recent=0 would leave nothing to index).
+    split = max(0, len(body) - max(1, keep_recent))
+    while split > 0 and body[split]["role"] != "model":
+        split -= 1
+    older, recent = body[:split], body[split:]
+
+    changed = False
+    if older:
+        summary_text = None
+        if summarize is not None:
+            try:
+                summary_text = summarize(previous_summary, older)
+            except Exception as e:
+                log(f"History summary failed, using heuristic summary: {e}")
+        if not summary_text:
+            summary_text = heuristic_summary(previous_summary, older, max_tokens=budget // 4)
+        if not summary_text.startswith(SUMMARY_HEADER):
+            summary_text = f"{SUMMARY_HEADER}\n{summary_text}"
+        history[:] = [{"role": "user", "parts": [summary_text]}] + recent
+        changed = True
+
+    # Still too large (e.g. very long transcribed answers): clip the recent turns,
+    # except the newest entry which the prompt is about
+    if prompt_tokens(prompt, history) > budget and len(history) > 1:
+        per_entry_chars = max(SUMMARY_LINE_CHARS, (budget * CHARS_PER_TOKEN) // (len(history) + 1))
+        for entry in history[1:-1]:
+            clipped = [clip_text(part, per_entry_chars) for part in entry["parts"]]
+            if clipped != entry["parts"]:
+                entry["parts"] = clipped
+                changed = True
+
+    return changed
+
+
+def heuristic_summary(previous_summary, older_entries, max_tokens):
+    lines = []
+    if previous_summary:
+        lines = previous_summary.split("\n")[1:]  # Drop the header
+    for entry in older_entries:
+        label = "Ứng viên" if entry["role"] == "user" else "Người phỏng vấn"
+        text = " ".join(" ".join(entry["parts"]).split())  # Collapse newlines/whitespace
+        lines.append(f"- {label}: {clip_text(text, SUMMARY_LINE_CHARS)}")
+    # Keep the summary itself bounded: forget the oldest lines first
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join([SUMMARY_HEADER] + lines)
+
+
+def _is_summary(entry):
+    return entry["role"] == "user" and entry["parts"] and entry["parts"][0].startswith(SUMMARY_HEADER)
+
+
+def clip_text(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + "…"
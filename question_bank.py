@@ -0,0 +1,165 @@
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+
+from research_cache import normalize_topic
+
+
+# --- Near-duplicate detection (MinHash over word shingles) ---
+# Two questions are near-duplicates when the estimated Jaccard similarity of their
+# word 3-gram sets reaches the threshold. Signatures are NUM_PERM minimum hashes;
+# LSH buckets (BANDS bands of ROWS values) find candidates without comparing
+# against every stored question.
+NUM_PERM = 64
+BANDS, ROWS = 16, 4 # BANDS * ROWS == NUM_PERM; catches pairs from roughly 0.5 similarity up
+SHINGLE_WORDS = 3
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1) # Fixed: stored signatures must stay comparable across restarts
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+
+def _words(text):
+    text = unicodedata.normalize("NFC", text).casefold()
+    text = re.sub(r"(câu hỏi\s*\d+\s*:)|[*_`#]", " ", text) # Drop numbering and markdown
+    return re.findall(r"\w+", text)
+
+
+def minhash(text):
+    words = _words(text)
+    if len(words) <= SHINGLE_WORDS:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles]
+    return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(signature_a, signature_b):
+    return sum(1 for x, y in zip(signature_a, signature_b) if x == y) / NUM_PERM
+
+
+def _bands(signature):
+    return [(band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+# --- Question bank ---
+# Every question the interview produces is recorded per topic ("first" questions and
+# follow-up "next" questions separately), unless it is a near-duplicate of one already
+# stored. take() serves a stored question for a share of requests (serve_ratio) once a
+# topic has at least min_questions, skipping anything similar to what this interview
+# has already asked. Optional SQLite persistence, like the session store.
+class QuestionBank:
+    def __init__(self, serve_ratio=0.0, threshold=0.7, min_questions=5, max_per_topic=1000, db_path=None):
+        self.serve_ratio = serve_ratio
+        self.threshold = threshold
+        self.min_questions = min_questions
+        self.max_per_topic = max_per_topic
+        self.db_path = db_path
+
+        self._entries = {} # (topic_key, position) -> [(question, signature)]
+        self._buckets = {} # (topic_key, position, band, band_values) -> [entry index]
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self._stats = {"added": 0, "duplicates": 0, "served": 0, "misses": 0}
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = self._connect()
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS question_bank ("
+                    " id INTEGER PRIMARY KEY,"
+                    " topic_key TEXT NOT NULL,"
+                    " position TEXT NOT NULL,"
+                    " question TEXT NOT NULL,"
+                    " signature BLOB NOT NULL,"
+                    " created_at REAL NOT NULL)"
+                )
+                rows = self._db.execute(
+                    "SELECT topic_key, position, question, signature FROM question_bank ORDER BY id").fetchall()
+            for topic_key, position, question, signature in rows:
+                self._index_locked(topic_key, position, question, tuple(array("Q", signature)))
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def add(self, topic, question, position="next"):
+        """Record a question; returns False if it was a near-duplicate (or the topic is full)."""
+        question = question.strip()
+        if not question or question.upper() == "END_INTERVIEW":
+            return False
+        topic_key = normalize_topic(topic)
+        signature = minhash(question)
+        with self._lock:
+            entries = self._entries.get((topic_key, position), [])
+            if len(entries) >= self.max_per_topic or self._find_similar_locked(topic_key, position, signature):
+                self._stats["duplicates"] += 1
+                return False
+            self._index_locked(topic_key, position, question, signature)
+            self._stats["added"] += 1
+        if self._db is not None:
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "INSERT INTO question_bank (topic_key, position, question, signature, created_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (topic_key, position, question, array("Q", signature).tobytes(), time.time()),
+                )
+        return True
+
+    def take(self, topic, position="next", asked=()):
+        """Return a stored question for this request, or None to generate one live.
+
+        Nothing in `asked` (this interview's questions so far) is repeated, not even
+        as a reworded near-duplicate.
+        """
+        if self.serve_ratio <= 0 or self._random.random() >= self.serve_ratio:
+            return None
+        topic_key = normalize_topic(topic)
+        asked_signatures = [minhash(question) for question in asked]
+        with self._lock:
+            entries = self._entries.get((topic_key, position), [])
+            if len(entries) < self.min_questions:
+                self._stats["misses"] += 1
+                return None
+            for index in self._random.sample(range(len(entries)), len(entries)):
+                question, signature = entries[index]
+                if all(similarity(signature, other) < self.threshold for other in asked_signatures):
+                    self._stats["served"] += 1
+                    return question
+            self._stats["misses"] += 1
+            return None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["questions"] = sum(len(entries) for entries in self._entries.values())
+            stats["topics"] = len({topic_key for topic_key, _ in self._entries})
+        return stats
+
+    # --- Internals ---
+    def _index_locked(self, topic_key, position, question, signature):
+        entries = self._entries.setdefault((topic_key, position), [])
+        entries.append((question, signature))
+        for band in _bands(signature):
+            self._buckets.setdefault((topic_key, position) + band, []).append(len(entries) - 1)
+
+    def _find_similar_locked(self, topic_key, position, signature):
+        entries = self._entries.get((topic_key, position), [])
+        candidates = set()
+        for band in _bands(signature):
+            candidates.update(self._buckets.get((topic_key, position) + band, ()))
+        return any(similarity(signature, entries[index][1]) >= self.threshold for index in candidates)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        if self.db_path:
+            self._db = self._connect()
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import log
+from research_cache import normalize_topic
+
+
+# --- Warm pool of pre-generated first questions ---
+# For each configured topic we keep up to pool_size questions generated ahead of time.
+# take() pops one (skipping expired ones) and schedules a background refill,
+# so /interview/start can answer without waiting for Gemini.
+class QuestionPool:
+    def __init__(self, generate, topics, pool_size=2, ttl=1800, max_workers=2):
+        self.generate = generate  # generate(topic) -> question text, may raise
+        self.pool_size = pool_size
+        self.ttl = ttl
+
+        self._topics = {normalize_topic(topic): topic for topic in topics}
+        self._pools = {key: deque() for key in self._topics}  # key -> deque of (created_at, question)
+        self._pending = {key: 0 for key in self._topics}  # refills scheduled but not finished
+        self._lock = threading.Lock()
+        self._executor = None
+        self._max_workers = max_workers
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "generated": 0, "errors": 0}
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def start(self):
+        """Fill every topic's pool in the background (idempotent)."""
+        if self.pool_size <= 0:
+            return
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="prefetch")
+        for key in self._topics:
+            self._schedule_refill(key)
+
+    def take(self, topic):
+        """Return a pre-generated question for topic, or None if none is ready."""
+        if self.pool_size <= 0:
+            return None
+        key = normalize_topic(topic)
+        if key not in self._pools:
+            return None
+        self.start()
+
+        question = None
+        now = time.time()
+        with self._lock:
+            pool = self._pools[key]
+            while pool:
+                created_at, candidate = pool.popleft()
+                if now - created_at <= self.ttl:
+                    question = candidate
+                    break
+                self._stats["expired"] += 1
+            self._stats["hits" if question is not None else "misses"] += 1
+        self._schedule_refill(key)
+        return question
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["ready"] = sum(len(pool) for pool in self._pools.values())
+        return stats
+
+    # --- Internals ---
+    def _reset_after_fork(self):
+        # The executor's threads do not exist in a forked worker: start() builds a new one there
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = {key: 0 for key in self._topics}
+
+    def _schedule_refill(self, key):
+        with self._lock:
+            if self._executor is None:
+                return
+            missing = self.pool_size - len(self._pools[key]) - self._pending[key]
+            self._pending[key] += max(0, missing)
+        for _ in range(missing):
+            self._executor.submit(self._refill_one, key)
+
+    def _refill_one(self, key):
+        try:
+            question = self.generate(self._topics[key])
+        except Exception as e:
+            # Leave the slot empty; the next take() for this topic schedules another attempt
+            log(f"Prefetch failed for topic {self._topics[key]}: {e}")
+            with self._lock:
+                self._stats["errors"] += 1
+            return
+        finally:
+            with self._lock:
+                self._pending[key] -= 1
+        with self._lock:
+            self._pools[key].append((time.time(), question))
+            self._stats["generated"] += 1
@@ -0,0 +1,203 @@
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+# "Docker", "docker " and "DOCKER" all map to the same cache entry
+def normalize_topic(topic):
+    topic = unicodedata.normalize("NFC", topic)
+    return " ".join(topic.split()).casefold()
+
+
+# One in-progress computation that concurrent callers for the same key wait on
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# --- Cache for /research reports ---
+# Memory tier: LRU (OrderedDict) with a TTL per entry.
+# Disk tier (optional): SQLite table, consulted on a memory miss and written on every put.
+# get_or_compute() coalesces concurrent misses for the same topic into one call;
+# claim()/finish()/wait() do the same for callers that stream the report.
+class ResearchCache:
+    def __init__(self, max_entries=256, ttl=86400, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # topic_key -> (created_at, report)
+        self._flights = {}  # topic_key -> _Flight
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0}
+
+        self.db_path = db_path
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = self._connect()
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS research_cache ("
+                    " topic_key TEXT PRIMARY KEY,"
+                    " report TEXT NOT NULL,"
+                    " created_at REAL NOT NULL)"
+                )
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def get(self, topic):
+        """Return the cached report for topic, or None."""
+        key = normalize_topic(topic)
+        now = time.time()
+        with self._lock:
+            report = self._memory_get_locked(key, now)
+            if report is not None:
+                self._stats["hits"] += 1
+                return report
+        report = self._disk_get(key, now)
+        with self._lock:
+            if report is not None:
+                self._stats["disk_hits"] += 1
+            else:
+                self._stats["misses"] += 1
+        return report
+
+    def put(self, topic, report):
+        key = normalize_topic(topic)
+        now = time.time()
+        with self._lock:
+            self._memory_put_locked(key, report, now)
+        if self._db is not None:
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO research_cache (topic_key, report, created_at) VALUES (?, ?, ?)",
+                    (key, report, now),
+                )
+
+    def get_or_compute(self, topic, compute):
+        """Return the cached report, or call compute() exactly once per key.
+
+        Callers that arrive while compute() is running for the same normalized
+        topic wait for its result. Errors are propagated to every waiter and
+        are not cached.
+        """
+        while True:
+            report, flight, leader = self.claim(topic)
+            if report is not None:
+                return report
+            if not leader:
+                report = self.wait(flight)
+                if report is not None:
+                    return report
+                continue # The leader gave up without a result: try again
+
+            try:
+                report = compute()
+            except Exception as e:
+                self.finish(topic, flight, error=e)
+                raise
+            except BaseException:
+                self.finish(topic, flight)
+                raise
+            self.finish(topic, flight, report=report)
+            return report
+
+    def claim(self, topic):
+        """Single-flight for callers that produce the report themselves (streaming).
+
+        Returns (report, flight, leader): the cached report if there is one, else
+        the in-progress flight for the topic. The leader must call finish(); the
+        others call wait(flight).
+        """
+        report = self.get(topic)
+        if report is not None:
+            return report, None, False
+
+        key = normalize_topic(topic)
+        with self._lock:
+            # A flight may have finished between the miss above and taking the lock
+            report = self._memory_get_locked(key, time.time())
+            if report is not None:
+                return report, None, False
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._stats["coalesced"] += 1
+                return None, flight, False
+            flight = self._flights[key] = _Flight()
+            return None, flight, True
+
+    def finish(self, topic, flight, report=None, error=None):
+        """End the leader's flight: a report is cached and handed to the waiters, an
+        error is raised in them. With neither (the leader gave up) waiters get None."""
+        if report is not None:
+            self.put(topic, report)
+        flight.result = report
+        flight.error = error
+        with self._lock:
+            if self._flights.get(normalize_topic(topic)) is flight:
+                del self._flights[normalize_topic(topic)]
+        flight.done.set()
+
+    def wait(self, flight):
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        return stats
+
+    # --- Internals ---
+    def _memory_get_locked(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, report = entry
+        if now - created_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return report
+
+    def _memory_put_locked(self, key, report, created_at):
+        self._entries[key] = (created_at, report)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def _reset_after_fork(self):
+        # Each worker process gets fresh locks, no in-flight computations and its own connection
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._db_lock = threading.Lock()
+        if self.db_path:
+            self._db = self._connect()
+
+    def _disk_get(self, key, now):
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT report, created_at FROM research_cache WHERE topic_key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        report, created_at = row
+        if now - created_at > self.ttl:
+            with self._db_lock, self._db:
+                self._db.execute("DELETE FROM research_cache WHERE topic_key = ?", (key,))
+            return None
+        # Promote to the memory tier, keeping the original creation time for TTL
+        with self._lock:
+            self._memory_put_locked(key, report, created_at)
+        return report
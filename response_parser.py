@@ -0,0 +1,130 @@
+import json
+import re
+
+
+# --- Structured AI output ---
+# Two formats carry the same sections:
+#   delimited:  ---FEEDBACK---\n...\n---NEXT_QUESTION---\n...   (the default prompts)
+#   JSON:       {"feedback": "...", "next_question": "..."}      (AI_JSON_OUTPUT=1, schema-constrained)
+# Both parse to {"FEEDBACK": "...", "NEXT_QUESTION": "..."}; sections that are missing
+# or empty are simply absent, and the caller decides whether to repair or default.
+FEEDBACK_SECTIONS = ("FEEDBACK", "NEXT_QUESTION", "SCORE_HINT")
+FINAL_SECTIONS = ("SUMMARY", "FINAL_SCORE")
+KNOWN_SECTIONS = frozenset(FEEDBACK_SECTIONS + FINAL_SECTIONS)
+
+# One marker regex, one finditer pass. Tolerates the drift models actually produce:
+# "--- FEEDBACK ---", "---feedback---", "**---FEEDBACK---**", "### ---FEEDBACK---",
+# and a missing closing dash run ("---FEEDBACK" at the end of a line).
+# The regex starts with the literal "---" (written "---+", not "-{3,}", so that re can
+# skip ahead to it); markdown before the marker ("**", "###") is cut off the previous
+# section by _marker_start.
+_MARKER = re.compile(r"---+[ \t]*([A-Za-z_ ]+?)[ \t]*(?:---+[*_ \t]*|(?=\n)|\Z)")
+_MARKER_PREFIX = "*#_ \t"
+
+
+class ResponseFormatError(ValueError):
+    def __init__(self, message, missing=()):
+        super().__init__(message)
+        self.missing = tuple(missing)
+
+
+def _section_key(label):
+    return label.strip().upper().replace(" ", "_")
+
+
+def _marker_start(text, match):
+    start = match.start()
+    while start > 0 and text[start - 1] in _MARKER_PREFIX:
+        start -= 1
+    return start
+
+
+def parse_delimited(text, sections):
+    """Single pass over text; returns {section: value} for the known, non-empty sections.
+
+    Text before the first marker is ignored. A marker of another known section ends
+    the current one without starting a new one; unknown markers are treated as text.
+    If a section occurs twice the first non-empty occurrence wins.
+    """
+    wanted = set(sections)
+    found = {}
+    current, start = None, 0
+    for match in _MARKER.finditer(text):
+        key = _section_key(match.group(1))
+        if key not in wanted and key not in KNOWN_SECTIONS:
+            continue
+        if current is not None and current not in found:
+            value = text[start:_marker_start(text, match)].strip()
+            if value:
+                found[current] = value
+        current, start = (key if key in wanted else None), match.end()
+    if current is not None and current not in found:
+        value = text[start:].strip()
+        if value:
+            found[current] = value
+    return found
+
+
+def parse_json(text, sections):
+    """Parse a JSON object with lowercase section keys (code fences allowed).
+
+    Raises ResponseFormatError if the text is not a JSON object; non-string and
+    empty values count as missing.
+    """
+    body = text.strip()
+    if body.startswith("```"):
+        body = body.strip("`")
+        if body[:4].lower() == "json":
+            body = body[4:]
+    try:
+        data = json.loads(body)
+    except ValueError as e:
+        raise ResponseFormatError(f"Invalid JSON: {e}", missing=sections)
+    if not isinstance(data, dict):
+        raise ResponseFormatError("JSON output is not an object", missing=sections)
+    found = {}
+    for section in sections:
+        value = data.get(section.lower())
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if isinstance(value, str) and value.strip():
+            found[section] = value.strip()
+    return found
+
+
+def parse_sections(text, sections, json_output=False):
+    """Parse either format; JSON mode falls back to the delimited parser if the model ignored it."""
+    if json_output:
+        try:
+            return parse_json(text, sections)
+        except ResponseFormatError:
+            pass
+    return parse_delimited(text, sections)
+
+
+def missing_sections(found, required):
+    return [section for section in required if section not in found]
+
+
+def json_schema(sections):
+    """Response schema for Gemini's constrained JSON output (all sections are required strings)."""
+    properties = {section.lower(): {"type": "string"} for section in sections}
+    return {"type": "object", "properties": properties, "required": [section.lower() for section in sections]}
+
+
+def completed_section(partial_text, section):
+    """Value of `section` once the marker after it has arrived (for streaming), else None.
+
+    Like parse_delimited, only known section markers end it; others are text.
+    """
+    current = None
+    start = 0
+    for match in _MARKER.finditer(partial_text):
+        key = _section_key(match.group(1))
+        if key not in KNOWN_SECTIONS:
+            continue
+        if current == section:
+            return partial_text[start:_marker_start(partial_text, match)].strip()
+        if key == section:
+            current, start = key, match.end()
+    return None
@@ -33,6 +33,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const BACKEND_URL = 'http://127.0.0.1:5000'; // Thay đổi nếu backend chạy ở host/port khác
 
     let currentQuestionNumber = 0;
+    let sessionId = null; // Interview session issued by /interview/start
     let totalQuestions = 10;
     let messageIndex = 0; // Counter for message animation delay
 
@@ -191,6 +192,31 @@ document.addEventListener('DOMContentLoaded', () => {
 
     }
 
+    // Read a server-sent event stream from a fetch() response (EventSource only supports GET)
+    // and call onEvent(eventName, data) for every complete event
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let eventName = 'message';
+                const dataLines = [];
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+                });
+                if (dataLines.length > 0) onEvent(eventName, JSON.parse(dataLines.join('\n')));
+            }
+        }
+    }
+
     function updateProgress(current, total) {
         const percentage = (current / total) * 100;
         progressBarFill.style.width = `${percentage}%`;
@@ -218,6 +244,7 @@ document.addEventListener('DOMContentLoaded', () => {
                  userAnswerTextarea.classList.remove('hidden');
                  interviewActive.querySelector('.user-input-area').classList.remove('hidden');
                  currentQuestionNumber = 0;
+                 sessionId = null; // Forget any previous interview session
                  messageIndex = 0; // Reset message index for animation
                  updateProgress(0, totalQuestions); // Reset progress
                  // Ensure voice button visibility is correct on section switch
@@ -297,6 +324,7 @@ document.addEventListener('DOMContentLoaded', () => {
                  interviewActive.querySelector('.user-input-area').classList.remove('hidden');
 
 
+                sessionId = data.session_id;
                 currentQuestionNumber = data.question_number;
                 totalQuestions = data.total_questions;
                 updateProgress(currentQuestionNumber, totalQuestions);
@@ -353,58 +381,33 @@ document.addEventListener('DOMContentLoaded', () => {
 
 
          try {
-             const response = await fetch(`${BACKEND_URL}/interview/answer`, {
+             // Streamed endpoint: feedback is shown as soon as it is complete,
+             // before the next question has finished generating
+             const response = await fetch(`${BACKEND_URL}/interview/answer/stream`, {
                  method: 'POST',
                  headers: {
                      'Content-Type': 'application/json',
                  },
-                 body: JSON.stringify({ answer: userAnswer }),
+                 body: JSON.stringify({ session_id: sessionId, answer: userAnswer }),
              });
 
-             const data = await response.json();
-
-             if (response.ok) {
-                 // Add feedback first
-                 appendMessageToLog('feedback', `Phản hồi: ${data.feedback}`);
-
-                 if (data.status === 'continue') {
-                     currentQuestionNumber++;
-                     updateProgress(currentQuestionNumber, totalQuestions);
-                     // Add next question after a slight delay to improve chat flow feel
-                     setTimeout(() => {
-                          appendMessageToLog('question', `Câu hỏi ${currentQuestionNumber}: ${data.next_question}`);
-                          // Re-enable input area and buttons after receiving next question
-                          userAnswerTextarea.disabled = false;
-                          submitAnswerBtn.disabled = false;
-                           if (voiceInputBtn) voiceInputBtn.disabled = false;
-                          userAnswerTextarea.focus(); // Focus textarea
-                          showLoading(false, 'interview'); // Hide loading
-                     }, 500); // 500ms delay
-                 } else if (data.status === 'finished') {
-                     updateProgress(totalQuestions, totalQuestions); // Complete progress bar
-                     questionCount.textContent = "Phỏng vấn hoàn thành!"; // Update text
-                     submitAnswerBtn.classList.add('hidden'); // Hide submit button
-                     userAnswerTextarea.classList.add('hidden'); // Hide textarea
-                     interviewActive.querySelector('.user-input-area').classList.add('hidden'); // Hide input area
-                     if (voiceInputBtn) voiceInputBtn.classList.add('hidden'); // Hide voice button
-
-
-                     interviewResultDiv.classList.remove('hidden');
-                     // Render summary with Markdown
-                     finalSummaryDiv.innerHTML = `<strong>Tóm tắt:</strong> ${renderMarkdown(data.final_summary, false)}`; // Use block rendering for summary
-                     finalScoreDiv.innerHTML = `<strong>Điểm số cuối cùng:</strong> <span class="final-score-value">${data.final_score}</span>`;
-                     showLoading(false, 'interview'); // Hide loading
+             if (!response.ok) {
+                 const data = await response.json();
+                 handleAnswerError(data.error || response.statusText, data.retryable, userAnswer);
+                 return;
+             }
 
+             let feedbackShown = false;
+             await readEventStream(response, (event, data) => {
+                 if (event === 'feedback') {
+                     appendMessageToLog('feedback', `Phản hồi: ${data.feedback}`);
+                     feedbackShown = true;
+                 } else if (event === 'result') {
+                     handleAnswerResult(data, feedbackShown);
+                 } else if (event === 'error') {
+                     handleAnswerError(data.error, data.retryable, userAnswer);
                  }
-             } else {
-                 displayError(`Lỗi xử lý câu trả lời: ${data.error || response.statusText}`);
-                 // Keep disabled on critical error or allow retrying?
-                 // For now, keep disabled to avoid multiple requests
-                  userAnswerTextarea.disabled = true;
-                  submitAnswerBtn.disabled = true;
-                  if (voiceInputBtn) voiceInputBtn.disabled = true;
-                  showLoading(false, 'interview'); // Hide loading
-             }
+             });
          } catch (error) {
              console.error('Error submitting answer:', error);
              displayError(`Lỗi kết nối đến server: ${error.message}`);
@@ -416,6 +419,105 @@ document.addEventListener('DOMContentLoaded', () => {
          }
     }
 
+    function handleAnswerResult(data, feedbackShown) {
+         // Add feedback first (unless it was already streamed in)
+         if (!feedbackShown) {
+             appendMessageToLog('feedback', `Phản hồi: ${data.feedback}`);
+         }
+
+         if (data.status === 'continue') {
+             currentQuestionNumber++;
+             updateProgress(currentQuestionNumber, totalQuestions);
+             // Add next question after a slight delay to improve chat flow feel
+             setTimeout(() => {
+                  appendMessageToLog('question', `Câu hỏi ${currentQuestionNumber}: ${data.next_question}`);
+                  // Re-enable input area and buttons after receiving next question
+                  userAnswerTextarea.disabled = false;
+                  submitAnswerBtn.disabled = false;
+                   if (voiceInputBtn) voiceInputBtn.disabled = false;
+                  userAnswerTextarea.focus(); // Focus textarea
+                  showLoading(false, 'interview'); // Hide loading
+             }, 500); // 500ms delay
+         } else if (data.status === 'finished') {
+             updateProgress(totalQuestions, totalQuestions); // Complete progress bar
+             questionCount.textContent = "Phỏng vấn hoàn thành!"; // Update text
+             submitAnswerBtn.classList.add('hidden'); // Hide submit button
+             userAnswerTextarea.classList.add('hidden'); // Hide textarea
+             interviewActive.querySelector('.user-input-area').classList.add('hidden'); // Hide input area
+             if (voiceInputBtn) voiceInputBtn.classList.add('hidden'); // Hide voice button
+
+
+             interviewResultDiv.classList.remove('hidden');
+             if (data.final_job_id) {
+                 // The final evaluation is generated in the background: show a placeholder and wait for the job
+                 finalSummaryDiv.innerHTML = '<strong>Tóm tắt:</strong> Đang tạo đánh giá cuối cùng...';
+                 finalScoreDiv.innerHTML = '';
+                 waitForJob(data.final_job_id)
+                     .then(showFinalEvaluation)
+                     .catch((error) => {
+                         finalSummaryDiv.innerHTML = '';
+                         displayError(`Không thể tải đánh giá cuối cùng: ${error.message}`);
+                         showLoading(false, 'interview');
+                     });
+             } else {
+                 showFinalEvaluation(data);
+             }
+         }
+    }
+
+    function showFinalEvaluation(evaluation) {
+         // Render summary with Markdown
+         finalSummaryDiv.innerHTML = `<strong>Tóm tắt:</strong> ${renderMarkdown(evaluation.final_summary, false)}`; // Use block rendering for summary
+         finalScoreDiv.innerHTML = `<strong>Điểm số cuối cùng:</strong> <span class="final-score-value">${evaluation.final_score}</span>`;
+         showLoading(false, 'interview'); // Hide loading
+    }
+
+    // Long-poll a background job until it finishes; resolves with its result
+    async function waitForJob(jobId) {
+         let failures = 0;
+         let delay = 500;
+         while (true) {
+             let job;
+             try {
+                 const response = await fetch(`${BACKEND_URL}/jobs/${encodeURIComponent(jobId)}?wait=25`);
+                 job = await response.json();
+                 if (!response.ok) {
+                     throw new Error(job.error || response.statusText);
+                 }
+             } catch (error) {
+                 // Brief network hiccups: retry a few times before giving up
+                 if (++failures >= 3) throw error;
+                 await new Promise((resolve) => setTimeout(resolve, 1000 * failures));
+                 continue;
+             }
+             if (job.status === 'done') return job.result;
+             if (job.status === 'error') throw new Error(job.error);
+             // Still running: normally the long-poll already waited, but a server that
+             // answers early (e.g. behind a proxy that cuts long requests) must not be hammered
+             failures = 0;
+             await new Promise((resolve) => setTimeout(resolve, delay));
+             delay = Math.min(delay * 2, 5000);
+         }
+    }
+
+    function handleAnswerError(message, retryable, userAnswer) {
+         displayError(`Lỗi xử lý câu trả lời: ${message}`);
+         if (retryable) {
+             // Temporary AI failure: the interview is still active, let the user resend the same answer
+             userAnswerTextarea.value = userAnswer;
+             userAnswerTextarea.disabled = false;
+             submitAnswerBtn.disabled = false;
+             if (voiceInputBtn) voiceInputBtn.disabled = false;
+             showLoading(false, 'interview');
+             return;
+         }
+         // Keep disabled on critical error to avoid multiple requests
+          userAnswerTextarea.disabled = true;
+          submitAnswerBtn.disabled = true;
+          if (voiceInputBtn) voiceInputBtn.disabled = true;
+          showLoading(false, 'interview'); // Hide loading
+    }
+
 
     submitAnswerBtn.addEventListener('click', sendAnswer);
 
@@ -436,7 +538,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
 
          try {
-             const response = await fetch(`${BACKEND_URL}/research`, {
+             // Streamed endpoint: the report is rendered incrementally as it arrives
+             const response = await fetch(`${BACKEND_URL}/research/stream`, {
                  method: 'POST',
                  headers: {
                      'Content-Type': 'application/json',
@@ -444,17 +547,27 @@ document.addEventListener('DOMContentLoaded', () => {
                  body: JSON.stringify({ topic: researchTopic }),
              });
 
-             const data = await response.json();
-
-             if (response.ok) {
-                 // Render report with Markdown
-                 researchReportContentDiv.innerHTML = renderMarkdown(data.report, false); // Use block rendering for report
-                 researchReportContentDiv.style.color = 'var(--text-color)'; // Reset color in case of previous error
-             } else {
-                  researchReportContentDiv.innerHTML = `Không thể tạo báo cáo. ${renderMarkdown(data.error || response.statusText, false)}`; // Render error report with Markdown
-                  researchReportContentDiv.style.color = 'var(--error-color)'; // Indicate error visually
-                  displayError(`Lỗi nghiên cứu: ${data.error || response.statusText}`);
+             if (!response.ok) {
+                 const data = await response.json();
+                 showResearchError(data.error || response.statusText);
+                 return;
              }
+
+             let reportText = '';
+             researchReportContentDiv.style.color = 'var(--text-color)'; // Reset color in case of previous error
+             await readEventStream(response, (event, data) => {
+                 if (event === 'delta') {
+                     reportText += data.text;
+                     // Hide the spinner once the first chunk is on screen
+                     researchLoadingIndicator.classList.add('hidden');
+                     researchReportContentDiv.innerHTML = renderMarkdown(reportText, false);
+                 } else if (event === 'done') {
+                     // Render report with Markdown
+                     researchReportContentDiv.innerHTML = renderMarkdown(data.report, false); // Use block rendering for report
+                 } else if (event === 'error') {
+                     showResearchError(data.error);
+                 }
+             });
          } catch (error) {
              console.error('Error performing research:', error);
               researchReportContentDiv.innerHTML = `Đã xảy ra lỗi kết nối. ${renderMarkdown(error.message, false)}`; // Render error report with Markdown
@@ -466,6 +579,13 @@ document.addEventListener('DOMContentLoaded', () => {
      }
 
 
+     function showResearchError(message) {
+          researchReportContentDiv.innerHTML = `Không thể tạo báo cáo. ${renderMarkdown(message, false)}`; // Render error report with Markdown
+          researchReportContentDiv.style.color = 'var(--error-color)'; // Indicate error visually
+          displayError(`Lỗi nghiên cứu: ${message}`);
+     }
+
+
     startResearchBtn.addEventListener('click', startResearch);
 
     // --- Add Enter key listeners ---
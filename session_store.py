@@ -0,0 +1,222 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class SessionConflict(Exception):
+    """The session was changed by another process while this request held it."""
+
+
+# --- Session-keyed interview state store ---
+# Hot tier: an in-memory OrderedDict used as an LRU, with idle expiry.
+# Cold tier (optional): a SQLite table, written through on every save so that
+# sessions survive a restart and sessions evicted from memory can be reloaded.
+# With SQLite the table is the source of truth, so several worker processes can
+# share it: every row has a version, session() reloads the memory copy when the
+# table holds a newer one and writes back only if the version is still the one it
+# read (compare-and-swap). Requests on one session are serialized within a process
+# by a lock; across processes the losing request gets SessionConflict instead of
+# overwriting the other one's progress.
+class SessionStore:
+    def __init__(self, max_sessions=500, idle_timeout=3600, db_path=None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.db_path = db_path
+
+        self._sessions = OrderedDict()  # session_id -> (last_access, state, version)
+        self._lock = threading.Lock()  # Guards _sessions and _session_locks
+        # Per-session locks live only while somebody holds a reference to them
+        self._session_locks = weakref.WeakValueDictionary()
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = self._connect()
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS sessions ("
+                    " session_id TEXT PRIMARY KEY,"
+                    " state TEXT NOT NULL,"
+                    " updated_at REAL NOT NULL)"
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)"
+                )
+                columns = [row[1] for row in self._db.execute("PRAGMA table_info(sessions)")]
+                if "version" not in columns: # Tables created before versioning
+                    self._db.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    # --- Public API ---
+    def create(self, state):
+        session_id = secrets.token_urlsafe(16)
+        self.save(session_id, state)
+        return session_id
+
+    def get(self, session_id):
+        return self._get(session_id)[0]
+
+    def save(self, session_id, state):
+        """Write state unconditionally (creation, or a single-process store)."""
+        now = time.time()
+        version = self._db_save(session_id, state, now)
+        self._remember(session_id, state, version, now)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self._db is not None:
+            with self._db_lock, self._db:
+                self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    @contextmanager
+    def session(self, session_id):
+        """Lock one session for the duration of a request.
+
+        Yields the state dict (or None if the session is unknown/expired) and
+        writes it back when the block exits, so concurrent requests on the
+        same interview are serialized while other interviews proceed.
+        """
+        lock = self._lock_for(session_id)
+        with lock:
+            state, version = self._get(session_id)
+            yield state
+            if state is not None:
+                now = time.time()
+                if self._db is not None and not self._db_swap(session_id, state, version, now):
+                    with self._lock:
+                        self._sessions.pop(session_id, None) # Reload the winner's state next time
+                    raise SessionConflict("Phiên phỏng vấn vừa được cập nhật bởi một yêu cầu khác. Vui lòng thử lại.")
+                self._remember(session_id, state, version + 1 if self._db is not None else version, now)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    # --- Internals ---
+    def _get(self, session_id):
+        """Return (state, version); state is None if the session is unknown or expired."""
+        if not session_id:
+            return None, 0
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                last_access, state, version = entry
+                if now - last_access > self.idle_timeout:
+                    del self._sessions[session_id]
+                    entry = None
+                elif self._db is None:
+                    self._sessions[session_id] = (now, state, version)
+                    self._sessions.move_to_end(session_id)
+                    return state, version
+        if self._db is None:
+            return None, 0
+
+        # The table is the source of truth: reuse the memory copy only while it is current
+        if entry is not None and self._db_version(session_id) == entry[2]:
+            state, version = entry[1], entry[2]
+        else:
+            state, version = self._db_load(session_id, now)
+        if state is None:
+            with self._lock:
+                self._sessions.pop(session_id, None)
+        else:
+            self._remember(session_id, state, version, now)
+        return state, version
+
+    def _remember(self, session_id, state, version, now):
+        with self._lock:
+            self._sessions[session_id] = (now, state, version)
+            self._sessions.move_to_end(session_id)
+            self._evict_locked(now)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def _reset_after_fork(self):
+        # Under a pre-forking server (gunicorn) each worker needs its own locks and
+        # SQLite connection: a connection inherited across fork() must not be used
+        self._lock = threading.Lock()
+        self._session_locks = weakref.WeakValueDictionary()
+        self._db_lock = threading.Lock()
+        if self.db_path:
+            self._db = self._connect()
+
+    def _lock_for(self, session_id):
+        with self._lock:
+            lock = self._session_locks.get(session_id)
+            if lock is None:
+                lock = threading.Lock()
+                self._session_locks[session_id] = lock
+            return lock
+
+    def _evict_locked(self, now):
+        # Drop idle sessions from the cold end first, then enforce the size bound.
+        # Evicted sessions stay in SQLite (if enabled) and are reloaded on demand.
+        while self._sessions:
+            oldest_id, (last_access, _, _) = next(iter(self._sessions.items()))
+            if now - last_access > self.idle_timeout or len(self._sessions) > self.max_sessions:
+                del self._sessions[oldest_id]
+            else:
+                break
+
+    def _db_version(self, session_id):
+        with self._db_lock:
+            row = self._db.execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _db_load(self, session_id, now):
+        """Return (state, version) from SQLite, or (None, 0)."""
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT state, updated_at, version FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None, 0
+        state_json, updated_at, version = row
+        if now - updated_at > self.idle_timeout:
+            self.delete(session_id)
+            return None, 0
+        return json.loads(state_json), version
+
+    def _db_save(self, session_id, state, now):
+        """Upsert the row; returns its new version (0 without SQLite)."""
+        if self._db is None:
+            return 0
+        state_json = json.dumps(state, ensure_ascii=False)
+        with self._db_lock, self._db:
+            self._db.execute(
+                "INSERT INTO sessions (session_id, state, updated_at, version) VALUES (?, ?, ?, 1)"
+                " ON CONFLICT (session_id) DO UPDATE SET"
+                " state = excluded.state, updated_at = excluded.updated_at, version = version + 1",
+                (session_id, state_json, now),
+            )
+            version = self._db.execute(
+                "SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()[0]
+            self._purge_locked(now)
+        return version
+
+    def _db_swap(self, session_id, state, version, now):
+        """Write state only if the row is still at `version`; False if another process got there first."""
+        state_json = json.dumps(state, ensure_ascii=False)
+        with self._db_lock, self._db:
+            updated = self._db.execute(
+                "UPDATE sessions SET state = ?, updated_at = ?, version = version + 1"
+                " WHERE session_id = ? AND version = ?",
+                (state_json, now, session_id, version),
+            ).rowcount
+            self._purge_locked(now)
+        return updated == 1
+
+    def _purge_locked(self, now):
+        # Opportunistically purge sessions that have been idle for too long
+        self._db.execute(
+            "DELETE FROM sessions WHERE updated_at < ?", (now - self.idle_timeout,)
+        )
@@ -0,0 +1,136 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import Response
+
+try:
+    import brotli # Optional: pip install brotli
+except ImportError:
+    brotli = None
+
+
+# --- Precompressed static assets ---
+# Only the files in the allowlist are ever served. They are read once at startup,
+# hashed and compressed (gzip, plus brotli when installed), so a request is a dict
+# lookup plus header checks:
+#   - ETag is the content hash; If-None-Match answers 304 without a body
+#   - index.html references the other assets as "script.js?v=<hash>", and a request
+#     carrying the current hash is cached for a year (immutable); anything else
+#     (index.html itself, unversioned URLs) must revalidate with the ETag
+HASH_CHARS = 16
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+MIN_COMPRESS_BYTES = 256 # Smaller bodies are not worth the Content-Encoding overhead
+
+
+class _Asset:
+    def __init__(self, name, body):
+        self.name = name
+        self.content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if self.content_type.startswith("text/") or self.content_type.endswith("javascript"):
+            self.content_type += "; charset=utf-8"
+        self.hash = hashlib.sha256(body).hexdigest()[:HASH_CHARS]
+        self.bodies = {"identity": body} # Content-Encoding -> bytes
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.bodies["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.bodies["br"] = brotli.compress(body, quality=11)
+            # Keep an encoding only if it actually saves bytes
+            for encoding in ("gzip", "br"):
+                if encoding in self.bodies and len(self.bodies[encoding]) >= len(body):
+                    del self.bodies[encoding]
+
+    def etag(self, encoding):
+        # One validator per representation; If-None-Match matching ignores the suffix
+        return f'"{self.hash}"' if encoding == "identity" else f'"{self.hash}-{encoding}"'
+
+
+class StaticAssets:
+    def __init__(self, root, names, index="index.html"):
+        self.root = root
+        self.index = index
+        self._assets = {}
+        # Load everything except the index first: the index embeds their hashes
+        for name in names:
+            if name != index:
+                self._assets[name] = _Asset(name, self._read(name))
+        if index in names:
+            html = self._read(index).decode("utf-8")
+            self._assets[index] = _Asset(index, self._version_references(html).encode("utf-8"))
+
+    def __contains__(self, name):
+        return name in self._assets
+
+    def manifest(self):
+        """name -> {hash, sizes per encoding}, e.g. for a deploy check or debugging."""
+        return {name: {"hash": asset.hash, "bytes": {enc: len(body) for enc, body in asset.bodies.items()}}
+                for name, asset in self._assets.items()}
+
+    def response(self, name, request):
+        """Build the response for an allowlisted asset, or None if name is not allowed."""
+        asset = self._assets.get(name)
+        if asset is None:
+            return None
+
+        encoding = self._choose_encoding(asset, request.headers.get("Accept-Encoding", ""))
+        headers = {
+            "ETag": asset.etag(encoding),
+            "Vary": "Accept-Encoding",
+            "Cache-Control": (IMMUTABLE_CACHE_CONTROL if request.args.get("v") == asset.hash
+                              else REVALIDATE_CACHE_CONTROL),
+        }
+        if self._etag_matches(asset, request.headers.get("If-None-Match", "")):
+            return Response(status=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(asset.bodies[encoding], status=200, headers=headers, content_type=asset.content_type)
+
+    # --- Internals ---
+    def _read(self, name):
+        with open(os.path.join(self.root, name), "rb") as f:
+            return f.read()
+
+    def _version_references(self, html):
+        # href="style.css" -> href="style.css?v=<hash>" for every allowlisted asset
+        def replace(match):
+            attribute, quote, name = match.group(1), match.group(2), match.group(3)
+            asset = self._assets.get(name)
+            if asset is None:
+                return match.group(0)
+            return f"{attribute}={quote}{name}?v={asset.hash}{quote}"
+        return re.sub(r'\b(href|src)=(["\'])([^"\'?#]+)\2', replace, html)
+
+    def _choose_encoding(self, asset, accept_encoding):
+        accepted = {}
+        for item in accept_encoding.split(","):
+            token, _, params = item.strip().partition(";")
+            quality = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            if token:
+                accepted[token.strip().lower()] = quality
+        for encoding in ("br", "gzip"): # Smallest first
+            if encoding in asset.bodies and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                return encoding
+        return "identity"
+
+    def _etag_matches(self, asset, if_none_match):
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag.strip('"').split("-")[0] == asset.hash:
+                return True
+        return False
@@ -0,0 +1,150 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionQueue, Overloaded, RateLimiter
+from llm_providers import FakeProvider
+
+
+def acquire_in_thread(queue, route_class):
+    """Start acquire() in a thread; the outcome lands in the returned dict."""
+    outcome = {}
+
+    def run():
+        try:
+            outcome["acquired_at"] = queue.acquire(route_class)
+        except Overloaded as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    outcome["thread"] = thread
+    return outcome
+
+
+def wait_for_waiters(queue, count):
+    deadline = time.monotonic() + 2
+    while queue.stats()["waiting"] < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queue.stats()["waiting"] == count
+
+
+def test_slots_run_fake_calls_up_to_max_active():
+    queue = AdmissionQueue(max_active=2, max_queue=8, queue_timeout=5)
+    provider = FakeProvider(latency_ms=50, latency_sigma=0)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def call():
+        acquired_at = queue.acquire("answer")
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        provider.send("Q?", [], timeout=5, kind="first_question")
+        with lock:
+            running.pop()
+        queue.release(acquired_at)
+
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(peak) == 2
+    assert queue.stats()["admitted"] == 6
+    assert queue.stats()["active"] == 0
+
+
+def test_full_queue_displaces_lower_priority_waiter():
+    queue = AdmissionQueue(max_active=1, max_queue=1, queue_timeout=5)
+    held = queue.acquire("answer")
+    research = acquire_in_thread(queue, "research")
+    wait_for_waiters(queue, 1)
+
+    answer = acquire_in_thread(queue, "answer")
+    research["thread"].join(timeout=2)
+    assert research["error"].status == 429
+    assert research["error"].reason == "queue_full"
+    assert queue.stats()["displaced"] == 1
+
+    queue.release(held)
+    answer["thread"].join(timeout=2)
+    assert "acquired_at" in answer
+    queue.release(answer["acquired_at"])
+
+
+def test_full_queue_rejects_equal_or_lower_priority_at_once():
+    queue = AdmissionQueue(max_active=1, max_queue=1, queue_timeout=5)
+    held = queue.acquire("answer")
+    waiting = acquire_in_thread(queue, "start")
+    wait_for_waiters(queue, 1)
+
+    for route_class in ("start", "prefetch"):
+        with pytest.raises(Overloaded) as info:
+            queue.acquire(route_class)
+        assert info.value.status == 429
+        assert info.value.retry_after >= 1
+
+    queue.release(held)
+    waiting["thread"].join(timeout=2)
+    queue.release(waiting["acquired_at"])
+
+
+def test_prefetch_is_displaced_by_batch():
+    queue = AdmissionQueue(max_active=1, max_queue=1, queue_timeout=5)
+    held = queue.acquire("batch")
+    prefetch = acquire_in_thread(queue, "prefetch")
+    wait_for_waiters(queue, 1)
+
+    batch = acquire_in_thread(queue, "batch")
+    prefetch["thread"].join(timeout=2)
+    assert prefetch["error"].reason == "queue_full"
+
+    queue.release(held)
+    batch["thread"].join(timeout=2)
+    queue.release(batch["acquired_at"])
+
+
+def test_queue_timeout_returns_503():
+    queue = AdmissionQueue(max_active=1, max_queue=4, queue_timeout=0.1)
+    held = queue.acquire("answer")
+    start = time.monotonic()
+    with pytest.raises(Overloaded) as info:
+        queue.acquire("research")
+    assert time.monotonic() - start >= 0.1
+    assert info.value.status == 503
+    assert info.value.reason == "queue_timeout"
+    stats = queue.stats()
+    assert stats["rejected_timeout"] == 1 and stats["waiting"] == 0
+    queue.release(held)
+
+
+def test_higher_priority_waiter_is_admitted_first():
+    queue = AdmissionQueue(max_active=1, max_queue=4, queue_timeout=5)
+    held = queue.acquire("answer")
+    research = acquire_in_thread(queue, "research")
+    wait_for_waiters(queue, 1)
+    answer = acquire_in_thread(queue, "answer")
+    wait_for_waiters(queue, 2)
+
+    queue.release(held)
+    answer["thread"].join(timeout=2)
+    assert "acquired_at" in answer
+    assert research["thread"].is_alive()
+    queue.release(answer["acquired_at"])
+    research["thread"].join(timeout=2)
+    queue.release(research["acquired_at"])
+
+
+def test_rate_limiter_allows_burst_then_rejects():
+    limiter = RateLimiter(rate_per_minute=60, burst=2)
+    limiter.check("1.2.3.4")
+    limiter.check("1.2.3.4")
+    with pytest.raises(Overloaded) as info:
+        limiter.check("1.2.3.4")
+    assert info.value.reason == "rate_limited"
+    assert info.value.retry_after >= 1
+    limiter.check("5.6.7.8") # Other clients have their own bucket
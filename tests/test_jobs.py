@@ -0,0 +1,94 @@
+import json
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from admission import Overloaded
+from jobs import JobManager
+from llm_providers import FakeProvider
+
+
+def fake_job(latency_ms=20):
+    provider = FakeProvider(latency_ms=latency_ms, latency_sigma=0)
+    return lambda: {"report": provider.send("Research Docker", [], timeout=5, kind="research").text}
+
+
+def test_job_result_via_long_poll():
+    manager = JobManager(max_workers=2)
+    job_id = manager.submit("research", fake_job())
+    record = manager.get(job_id, wait=5)
+    assert record["status"] == "done"
+    assert record["result"]["report"]
+    assert manager.get("missing") is None
+
+
+def test_failed_job_reports_retryable_flag():
+    manager = JobManager()
+
+    def fail():
+        error = RuntimeError("upstream down")
+        error.retryable = True
+        raise error
+
+    record = manager.get(manager.submit("research", fail), wait=5)
+    assert record["status"] == "error"
+    assert record["error"] == "upstream down" and record["retryable"] is True
+
+
+def test_queue_overflow_raises_overloaded():
+    manager = JobManager(max_workers=1, max_queue=2)
+    release = threading.Event()
+    first = manager.submit("research", lambda: release.wait(5))
+    deadline = time.monotonic() + 2
+    while manager.get(first)["status"] != "running" and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    queued = [manager.submit("research", fake_job()) for _ in range(2)]
+    with pytest.raises(Overloaded) as info:
+        manager.submit("research", fake_job())
+    assert info.value.reason == "jobs_full"
+    assert info.value.retry_after >= 1
+    assert manager.stats()["queued"] == 2
+
+    release.set()
+    for job_id in queued:
+        assert manager.get(job_id, wait=5)["status"] == "done"
+    manager.submit("research", fake_job()) # Room again
+
+
+def test_other_worker_waits_for_result_through_sqlite(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    owner, other = JobManager(db_path=db_path), JobManager(db_path=db_path)
+    job_id = owner.submit("research", fake_job(latency_ms=300))
+    record = other.get(job_id, wait=5)
+    assert record["status"] == "done"
+    assert other.get(job_id, wait=0.05)["status"] == "done"
+
+
+def test_job_of_dead_process_is_reported_failed(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    manager = JobManager(db_path=db_path)
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    manager._db_save({"job_id": "orphan", "kind": "research", "status": "running", "pid": process.pid,
+                      "created_at": time.time(), "started_at": time.time()})
+
+    record = JobManager(db_path=db_path).get("orphan", wait=5)
+    assert record["status"] == "error" and record["retryable"] is True
+    # The failure is written back for every other poller
+    row = manager._db.execute("SELECT record FROM jobs WHERE job_id = 'orphan'").fetchone()
+    assert json.loads(row[0])["status"] == "error"
+
+
+def test_overdue_job_is_failed_and_late_result_ignored():
+    manager = JobManager(max_runtime=0.2)
+    job_id = manager.submit("research", fake_job(latency_ms=800))
+    start = time.monotonic()
+    record = manager.get(job_id, wait=5)
+    assert record["status"] == "error" and record["retryable"] is True
+    assert time.monotonic() - start < 1.5
+    time.sleep(0.8)
+    assert manager.get(job_id)["status"] == "error"
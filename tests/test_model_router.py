@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from llm_providers import FakeProvider, FakeUpstreamError, LLMProvider
+from model_router import RoutedProvider, parse_routes
+
+
+class BadRequest(Exception):
+    code = 400
+
+
+class Recording(LLMProvider):
+    """Wraps a FakeProvider, counts calls and optionally fails every one."""
+    name = "fake"
+
+    def __init__(self, latency_ms=10, error=None):
+        self.inner = FakeProvider(latency_ms=latency_ms, latency_sigma=0)
+        self.error = error
+        self.calls = 0
+
+    def send(self, prompt, history, timeout, stream=False, kind=None, response_schema=None):
+        self.calls += 1
+        if self.error is not None:
+            time.sleep(0.01)
+            raise self.error
+        return self.inner.send(prompt, history, timeout, stream=stream, kind=kind, response_schema=response_schema)
+
+
+def router(primary, backup, hedge_after=None):
+    return RoutedProvider({"main": primary, "lite": backup}, {"feedback": ["main", "lite"]}, ["main"],
+                          hedge_after=hedge_after)
+
+
+def test_parse_routes():
+    assert parse_routes("feedback=m1, m2;research=m3;bad=;") == {"feedback": ["m1", "m2"], "research": ["m3"]}
+    assert parse_routes(None) == {}
+
+
+def test_fails_over_on_retryable_error():
+    primary, backup = Recording(error=FakeUpstreamError("503 unavailable")), Recording()
+    response = router(primary, backup).send("Q?", [], timeout=5, kind="feedback")
+    assert "---FEEDBACK---" in response.text
+    assert (primary.calls, backup.calls) == (1, 1)
+
+
+def test_fails_over_on_timeout():
+    primary, backup = Recording(error=TimeoutError("slow")), Recording()
+    router(primary, backup).send("Q?", [], timeout=5, kind="feedback")
+    assert backup.calls == 1
+
+
+def test_no_failover_on_bad_request():
+    primary, backup = Recording(error=BadRequest("400 invalid argument")), Recording()
+    with pytest.raises(BadRequest):
+        router(primary, backup).send("Q?", [], timeout=5, kind="feedback")
+    assert backup.calls == 0
+
+
+def test_raises_last_error_when_every_model_fails():
+    primary = Recording(error=FakeUpstreamError("503 unavailable"))
+    backup = Recording(error=FakeUpstreamError("503 also unavailable"))
+    with pytest.raises(FakeUpstreamError, match="also"):
+        router(primary, backup).send("Q?", [], timeout=5, kind="feedback")
+
+
+def test_hedges_slow_primary():
+    primary, backup = Recording(latency_ms=1000), Recording(latency_ms=10)
+    start = time.monotonic()
+    router(primary, backup, hedge_after=0.05).send("Q?", [], timeout=5, kind="feedback")
+    assert time.monotonic() - start < 0.5
+    assert (primary.calls, backup.calls) == (1, 1)
+
+
+def test_no_hedge_when_primary_is_fast():
+    primary, backup = Recording(latency_ms=10), Recording()
+    router(primary, backup, hedge_after=0.5).send("Q?", [], timeout=5, kind="feedback")
+    assert backup.calls == 0
+
+
+def test_unrouted_kind_goes_straight_to_default_model():
+    primary, backup = Recording(error=FakeUpstreamError("503 unavailable")), Recording()
+    with pytest.raises(FakeUpstreamError):
+        router(primary, backup).send("Q?", [], timeout=5, kind="research")
+    assert backup.calls == 0
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from llm_providers import FakeProvider
+from research_cache import ResearchCache
+
+
+def fake_report(provider, topic):
+    return provider.send(f"Research {topic}", [], timeout=5, kind="research").text
+
+
+def test_concurrent_misses_share_one_call():
+    cache = ResearchCache()
+    provider = FakeProvider(latency_ms=100, latency_sigma=0)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return fake_report(provider, "Docker")
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("  docker ", compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(set(results)) == 1
+    assert cache.stats()["coalesced"] >= 1
+
+
+def test_waiter_takes_over_when_leader_gives_up():
+    cache = ResearchCache()
+    provider = FakeProvider(latency_ms=10, latency_sigma=0)
+    report, flight, leader = cache.claim("Docker")
+    assert report is None and leader
+
+    outcome = {}
+
+    def follower():
+        report, waiting_on, is_leader = cache.claim("Docker")
+        assert not is_leader
+        outcome["waited"] = cache.wait(waiting_on)
+        # The leading client disconnected without a report: claim again and produce it
+        report, own_flight, is_leader = cache.claim("Docker")
+        outcome["leader"] = is_leader
+        cache.finish("Docker", own_flight, report=fake_report(provider, "Docker"))
+
+    thread = threading.Thread(target=follower)
+    thread.start()
+    time.sleep(0.05) # Let the follower start waiting
+    cache.finish("Docker", flight) # Leader went away
+    thread.join(timeout=5)
+
+    assert outcome["waited"] is None
+    assert outcome["leader"] is True
+    report, flight, leader = cache.claim("docker")
+    assert report and flight is None and not leader
+
+
+def test_leader_error_reaches_waiters_and_is_not_cached():
+    cache = ResearchCache()
+    _, flight, _ = cache.claim("Docker")
+    _, waiting_on, leader = cache.claim("Docker")
+    assert not leader
+    cache.finish("Docker", flight, error=TimeoutError("slow upstream"))
+    with pytest.raises(TimeoutError):
+        cache.wait(waiting_on)
+    assert cache.claim("Docker")[2] is True